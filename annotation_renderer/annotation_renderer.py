@@ -0,0 +1,76 @@
+import os
+import sys
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+sys.path.append("../")
+from utils import draw_ellipse, draw_triangle, draw_speed_and_distance, draw_team_ball_control_panel, draw_camera_movement_panel
+from player_ball_assigner import PossessionStats
+from profiler import NULL_PROFILER
+
+
+def draw_frame_overlays(frame, players, referees, ball, possession, camera_movement=None):
+    # Draws one frame's tracks, the possession panel (team 1 and team 2 shares) and, when given, the
+    # camera movement panel in place
+    for track_id, player in players.items():
+        color = player.get("team_color", (0, 0, 255))
+        draw_ellipse(frame, player["box"], color, track_id, draw_track_id=True)
+        if player.get("has_ball", False):
+            draw_triangle(frame, player["box"], (0, 0, 255))
+        if "distance" in player:
+            draw_speed_and_distance(frame, player["box"], player.get("speed"), player["distance"])
+
+    for _, referee in referees.items():
+        draw_ellipse(frame, referee["box"], (0, 255, 255), draw_track_id=False)
+
+    for _, ball_track in ball.items():
+        draw_triangle(frame, ball_track["box"], (0, 255, 0))
+
+    draw_team_ball_control_panel(frame, *possession)
+
+    if camera_movement is not None:
+        draw_camera_movement_panel(frame, camera_movement)
+    return frame
+
+
+class AnnotationRenderer:
+    # Single rendering stage for the track overlays, the possession panel and the camera movement panel.
+    # Frames are drawn in place and, since they are independent once tracks are final, spread over a
+    # thread pool (OpenCV drawing releases the GIL). At most max_in_flight frames are held at once.
+    def __init__(self, tracks, team_ball_control, camera_movement_per_frame=None, workers=None, max_in_flight=None,
+                 profiler=None):
+        self.tracks = tracks
+        if not isinstance(team_ball_control, PossessionStats):
+            team_ball_control = PossessionStats(team_ball_control)
+        self.possession_stats = team_ball_control
+        self.camera_movement_per_frame = camera_movement_per_frame
+        self.workers = workers or os.cpu_count() or 1
+        self.max_in_flight = max_in_flight or 2 * self.workers
+        self.profiler = profiler or NULL_PROFILER
+
+    def render_frame(self, frame, frame_num):
+        with self.profiler.stage("draw"):
+            return self._render_frame(frame, frame_num)
+
+    def _render_frame(self, frame, frame_num):
+        camera_movement = None
+        if self.camera_movement_per_frame is not None:
+            camera_movement = self.camera_movement_per_frame[frame_num]
+        return draw_frame_overlays(frame, self.tracks["players"][frame_num], self.tracks["referees"][frame_num],
+                                   self.tracks["ball"][frame_num], self.possession_stats.percentages(frame_num),
+                                   camera_movement)
+
+    def render(self, frames):
+        # Yields the annotated frames in order; works on lists and lazily decoded iterators alike
+        if self.workers <= 1:
+            for frame_num, frame in enumerate(frames):
+                yield self.render_frame(frame, frame_num)
+            return
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            pending = deque()
+            for frame_num, frame in enumerate(frames):
+                pending.append(executor.submit(self.render_frame, frame, frame_num))
+                if len(pending) >= self.max_in_flight:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
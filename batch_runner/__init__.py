@@ -0,0 +1 @@
+from .batch_runner import load_jobs, run_batch, run_job, summarize
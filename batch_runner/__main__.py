@@ -0,0 +1,4 @@
+import sys
+from .batch_runner import main
+
+sys.exit(main())
@@ -0,0 +1,190 @@
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+sys.path.append("../")
+import numpy as np
+from utils import worker_state, init_worker_state, write_json_atomic
+from trackers import Tracker
+from stage_cache import StageCache
+from profiler import StageProfiler
+from pipeline import process_video
+
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv", ".m4v")
+
+def load_jobs(source, output_dir, output_extension=".avi"):
+    # source is a directory of videos, a text file with one video path per line, or a JSON / JSON-lines
+    # manifest of {"video": ..., "name": ..., "output": ...} entries. Relative paths in a manifest are
+    # taken relative to the manifest.
+    if os.path.isdir(source):
+        entries = [{"video": os.path.basename(path)} for path in sorted(glob.glob(os.path.join(source, "*")))
+                   if os.path.splitext(path)[1].lower() in VIDEO_EXTENSIONS]
+        base_dir = source
+    else:
+        with open(source) as file:
+            text = file.read()
+        if source.endswith(".json"):
+            entries = json.loads(text)
+        elif source.endswith(".jsonl"):
+            entries = [json.loads(line) for line in text.splitlines() if line.strip()]
+        else:
+            entries = [{"video": line.strip()} for line in text.splitlines()
+                       if line.strip() and not line.lstrip().startswith("#")]
+        base_dir = os.path.dirname(os.path.abspath(source))
+
+    jobs, names = [], set()
+    for entry in entries:
+        video_path = os.path.join(base_dir, entry["video"])
+        name = entry.get("name") or os.path.splitext(os.path.basename(video_path))[0]
+        if name in names:
+            raise ValueError(f"Two videos are named {name!r}, give them distinct names in the manifest")
+        names.add(name)
+        jobs.append({
+            "name": name,
+            "video": video_path,
+            "output": os.path.join(base_dir, entry["output"]) if entry.get("output")
+                      else os.path.join(output_dir, name + output_extension),
+            "result": os.path.join(output_dir, name + ".json"),
+        })
+    return jobs
+
+
+def is_completed(job):
+    if not (os.path.exists(job["result"]) and os.path.exists(job["output"])):
+        return False
+    with open(job["result"]) as file:
+        return json.load(file).get("status") == "done"
+
+
+def run_job(job, writer_options=None, profile=False):
+    # Each worker process loads the detector once and reuses it for every video it is given
+    tracker = worker_state["tracker"]
+    tracker.reset_tracking()
+    profiler = StageProfiler() if profile else None
+    # The job's profiler also times the tracker's preprocess, detect and track stages
+    tracker_profiler = tracker.profiler
+    if profiler is not None:
+        tracker.profiler = profiler
+    detector_calls = tracker.detector_calls
+    start = time.perf_counter()
+
+    result = {"name": job["name"], "video": job["video"], "output": job["output"]}
+    try:
+        processed = process_video(job["video"], job["output"], tracker, cache=worker_state["cache"],
+                                  writer_options=writer_options, profiler=profiler)
+        if processed is None:
+            raise IOError(f"Could not read {job['video']}")
+        tracks, possession_stats = processed
+        team_1, team_2 = possession_stats.percentages(tracks.num_frames - 1) if tracks.num_frames else (0.0, 0.0)
+        result.update({
+            "status": "done",
+            "frames": tracks.num_frames,
+            "players": int(len(np.unique(tracks["track_id"][tracks.class_mask("players")]))),
+            "possession": {"team_1": float(team_1), "team_2": float(team_2)},
+            "turnovers": int(len(possession_stats.turnovers())),
+            # Zero when detections or tracks came from the stage cache
+            "detector_frames": tracker.detector_calls - detector_calls,
+        })
+    except Exception as error:
+        result.update({"status": "failed", "error": repr(error), "traceback": traceback.format_exc()})
+    finally:
+        tracker.profiler = tracker_profiler
+
+    result["seconds"] = time.perf_counter() - start
+    if profiler is not None:
+        result["profile"] = profiler.summary()
+    write_json_atomic(job["result"], result, indent=2)
+    return result
+
+
+def run_batch(jobs, model_path, workers=None, cache_dir=None, tracker_kwargs=None, writer_options=None,
+              profile=False, force=False, retries=1):
+    # Finished videos (a "done" result next to the output) are skipped unless force is set, so an
+    # interrupted batch resumes where it stopped. A worker crash breaks the pool; the videos that did not
+    # finish are then retried in a fresh pool up to `retries` times.
+    results = {}
+    for job in jobs:
+        if not force and is_completed(job):
+            with open(job["result"]) as file:
+                results[job["name"]] = dict(json.load(file), skipped=True)
+    pending = [job for job in jobs if job["name"] not in results]
+
+    for attempt in range(retries + 1):
+        if not pending:
+            break
+        builders = {"tracker": (Tracker, (model_path,), tracker_kwargs or {}),
+                    "cache": (StageCache, (cache_dir,), {}) if cache_dir else None}
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1, initializer=init_worker_state,
+                                 initargs=(builders,)) as executor:
+            futures = {executor.submit(run_job, job, writer_options, profile): job for job in pending}
+            try:
+                for future in as_completed(futures):
+                    job = futures[future]
+                    results[job["name"]] = future.result()
+                    print(f"{job['name']}: {results[job['name']]['status']} "
+                          f"in {results[job['name']]['seconds']:.1f}s")
+            except BrokenProcessPool:
+                unfinished = sum(1 for job in pending if job["name"] not in results)
+                print(f"A worker process died, {unfinished} videos left (attempt {attempt + 1})")
+        pending = [job for job in pending if job["name"] not in results]
+
+    for job in pending:
+        results[job["name"]] = {"name": job["name"], "video": job["video"], "status": "crashed"}
+    return [results[job["name"]] for job in jobs]
+
+
+def summarize(results, seconds):
+    statuses = [result["status"] for result in results]
+    frames = sum(result.get("frames", 0) for result in results if not result.get("skipped"))
+    return {
+        "videos": len(results),
+        "done": statuses.count("done"),
+        "skipped": sum(1 for result in results if result.get("skipped")),
+        "failed": [result["name"] for result in results if result["status"] != "done"],
+        "frames_processed": frames,
+        "seconds": seconds,
+        "fps": frames / seconds if seconds > 0 else None,
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the football analysis over many videos")
+    parser.add_argument("source", help="directory of videos, text file of video paths, or .json/.jsonl manifest")
+    parser.add_argument("--output-dir", required=True, help="annotated videos and per-video results are written here")
+    parser.add_argument("--model", required=True, help="detector weights (.pt) or exported graph (.onnx)")
+    parser.add_argument("--backend", choices=["ultralytics", "onnxruntime"], help="detector backend, chosen from the model extension by default")
+    parser.add_argument("--workers", type=int, help="number of worker processes, one per core by default")
+    parser.add_argument("--cache-dir", help="stage cache shared by the workers, so reruns skip finished stages")
+    parser.add_argument("--keyframe-interval", type=int, help="run the detector every n frames and propagate boxes with optical flow in between")
+    parser.add_argument("--codec", help="fourcc of the output videos")
+    parser.add_argument("--output-extension", default=".avi", help="container of the output videos")
+    parser.add_argument("--profile", action="store_true", help="add per-stage timings to each video's result")
+    parser.add_argument("--force", action="store_true", help="reprocess videos that already have a result")
+    parser.add_argument("--retries", type=int, default=1, help="times videos are retried after a worker crash")
+    args = parser.parse_args()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    jobs = load_jobs(args.source, args.output_dir, args.output_extension)
+    start = time.perf_counter()
+    results = run_batch(jobs, args.model, args.workers, args.cache_dir,
+                        tracker_kwargs={"keyframe_interval": args.keyframe_interval, "backend": args.backend},
+                        writer_options={"codec": args.codec}, profile=args.profile, force=args.force,
+                        retries=args.retries)
+    summary = summarize(results, time.perf_counter() - start)
+    write_json_atomic(os.path.join(args.output_dir, "summary.json"), summary, indent=2)
+
+    print(f"{summary['done']}/{summary['videos']} videos done ({summary['skipped']} already done), "
+          f"{summary['frames_processed']} frames in {summary['seconds']:.1f}s")
+    for name in summary["failed"]:
+        print(f"Failed: {name}")
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
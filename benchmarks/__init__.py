@@ -0,0 +1 @@
+from .synthetic import SyntheticMatch, write_synthetic_video, save_canned_detections, load_canned_detections
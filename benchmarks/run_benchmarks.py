@@ -0,0 +1,176 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+sys.path.append("../")
+from utils import read_video, save_video
+from trackers import Tracker
+from trackers.detector_backends import ReplayBackend
+from camera_movement_estimator import CameraMovementEstimator
+from team_assigner import TeamAssigner
+from player_ball_assigner import PlayerBallAssigner
+from annotation_renderer import AnnotationRenderer
+from pipeline import assign_player_teams, assign_ball_possession, build_track_table
+from profiler import StageProfiler
+from benchmarks.synthetic import write_synthetic_video, save_canned_detections, load_canned_detections
+
+# name: (frames, width, height)
+SCALES = {
+    "tiny": (50, 640, 360),
+    "small": (150, 1280, 720),
+    "medium": (300, 1920, 1080),
+    "large": (750, 1920, 1080),
+}
+
+STAGES = ("get_object_tracks", "get_camera_movement", "team_assigner", "build_track_table",
+          "player_ball_assigner", "draw_annotations", "save_video")
+
+
+def prepare_inputs(workdir, scale):
+    # Synthetic video and canned detections are generated once per scale and reused by later runs
+    num_frames, width, height = SCALES[scale]
+    video_path = os.path.join(workdir, f"{scale}.avi")
+    detections_path = os.path.join(workdir, f"{scale}_detections.npz")
+    if not (os.path.exists(video_path) and os.path.exists(detections_path)):
+        save_canned_detections(detections_path, write_synthetic_video(video_path, num_frames, width, height))
+    return video_path, detections_path
+
+
+def run_scale(workdir, scale):
+    # Runs the in-memory pipeline of main.py stage by stage, with canned detections instead of the model
+    video_path, detections_path = prepare_inputs(workdir, scale)
+    detections, class_names = load_canned_detections(detections_path)
+    profiler = StageProfiler()
+
+    frames = read_video(video_path)
+    num_frames = len(frames)
+
+    with profiler.stage("get_object_tracks", num_frames):
+        tracker = Tracker(None, backend=ReplayBackend(detections, class_names))
+        tracks = tracker.get_object_tracks(frames)
+
+    with profiler.stage("get_camera_movement", num_frames):
+        camera_movement_per_frame = CameraMovementEstimator(frames[0]).get_camera_movement(frames)
+
+    with profiler.stage("team_assigner", num_frames):
+        team_assigner = TeamAssigner()
+        for frame_num, frame in enumerate(frames):
+            assign_player_teams(team_assigner, frame, tracks["players"][frame_num])
+
+    with profiler.stage("build_track_table", num_frames):
+        tracks = build_track_table(tracks, camera_movement_per_frame, team_assigner)
+
+    with profiler.stage("player_ball_assigner", num_frames):
+        team_ball_control = assign_ball_possession(tracks, PlayerBallAssigner())
+
+    with profiler.stage("draw_annotations", num_frames):
+        renderer = AnnotationRenderer(tracks, team_ball_control, camera_movement_per_frame)
+        frames = list(renderer.render(frames))
+
+    with profiler.stage("save_video", num_frames):
+        save_video(frames, os.path.join(workdir, f"{scale}_output.avi"), fps=25)
+
+    summary = profiler.summary()
+    return {
+        "frames": num_frames,
+        "resolution": list(SCALES[scale][1:]),
+        "peak_rss_bytes": summary["peak_rss_bytes"],
+        "stages": {
+            name: {key: stage[key] for key in ("wall_seconds", "cpu_seconds", "fps")}
+            for name, stage in summary["stages"].items()
+        },
+    }
+
+
+def run_benchmarks(scales, workdir, repeats=1):
+    # Every run gets a fresh process, so peak RSS is measured per scale and nothing is warmed up by earlier runs
+    results = {}
+    context = multiprocessing.get_context("spawn")
+    for scale in scales:
+        runs = []
+        for _ in range(repeats):
+            with context.Pool(1) as pool:
+                runs.append(pool.apply(run_scale, (workdir, scale)))
+        # Keep the fastest run of each stage, the least disturbed by the rest of the machine
+        best = runs[0]
+        for run in runs[1:]:
+            for name, stage in run["stages"].items():
+                if stage["wall_seconds"] < best["stages"][name]["wall_seconds"]:
+                    best["stages"][name] = stage
+            best["peak_rss_bytes"] = max(best["peak_rss_bytes"] or 0, run["peak_rss_bytes"] or 0)
+        results[scale] = best
+    return {"machine": {"platform": platform.platform(), "python": platform.python_version(),
+                        "cpus": os.cpu_count()},
+            "scales": results}
+
+
+def compare_to_baseline(results, baseline, tolerance=0.2):
+    # A stage regresses when it takes more than (1 + tolerance) times its baseline wall time
+    regressions = []
+    for scale, result in results["scales"].items():
+        baseline_scale = baseline.get("scales", {}).get(scale)
+        if baseline_scale is None:
+            continue
+        for name, stage in result["stages"].items():
+            baseline_stage = baseline_scale["stages"].get(name)
+            if baseline_stage is None or baseline_stage["wall_seconds"] <= 0:
+                continue
+            ratio = stage["wall_seconds"] / baseline_stage["wall_seconds"]
+            stage["baseline_ratio"] = ratio
+            if ratio > 1 + tolerance:
+                regressions.append((scale, name, ratio))
+    return regressions
+
+
+def format_results(results):
+    lines = []
+    for scale, result in results["scales"].items():
+        width, height = result["resolution"]
+        peak = result["peak_rss_bytes"]
+        lines.append(f"{scale}: {result['frames']} frames at {width}x{height}"
+                     + (f", peak RSS {peak / 1024 ** 2:.0f} MiB" if peak else ""))
+        lines.append(f"  {'stage':<22}{'wall s':>10}{'cpu s':>10}{'fps':>10}{'vs base':>10}")
+        for name in STAGES:
+            stage = result["stages"][name]
+            ratio = f"{stage['baseline_ratio']:.2f}x" if "baseline_ratio" in stage else "-"
+            lines.append(f"  {name:<22}{stage['wall_seconds']:>10.3f}{stage['cpu_seconds']:>10.3f}"
+                         f"{stage['fps']:>10.1f}{ratio:>10}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks on synthetic videos with canned detections")
+    parser.add_argument("--scales", nargs="+", choices=list(SCALES), default=["tiny", "small"])
+    parser.add_argument("--repeats", type=int, default=1, help="runs per scale, the fastest one is reported")
+    parser.add_argument("--workdir", help="where the synthetic videos are generated and kept between runs")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare against the results stored in this JSON file")
+    parser.add_argument("--save-baseline", help="store the results as a new baseline in this JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown against the baseline")
+    args = parser.parse_args()
+
+    workdir = args.workdir or os.path.join(tempfile.gettempdir(), "football_analysis_benchmarks")
+    os.makedirs(workdir, exist_ok=True)
+    results = run_benchmarks(args.scales, workdir, args.repeats)
+
+    regressions = []
+    if args.baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as file:
+            regressions = compare_to_baseline(results, json.load(file), args.tolerance)
+
+    print(format_results(results))
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w") as file:
+                json.dump(results, file, indent=2)
+
+    for scale, name, ratio in regressions:
+        print(f"Regression: {scale}/{name} is {ratio:.2f}x its baseline wall time")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,152 @@
+import numpy as np
+import cv2 as cv
+import supervision as sv
+
+# Same class layout as the trained model, so the canned detections go through the usual class handling
+CLASS_NAMES = {0: "ball", 1: "goalkeeper", 2: "player", 3: "referee"}
+TEAM_COLORS = ((40, 40, 220), (220, 60, 40))
+GOALKEEPER_COLOR = (40, 200, 40)
+REFEREE_COLOR = (20, 220, 230)
+SHORTS_COLOR = (25, 25, 25)
+GRASS_COLORS = ((50, 140, 50), (60, 155, 60))
+
+
+def draw_pitch(width, height):
+    # Striped grass with white lines, so the corners picked up by the camera movement estimator move with the pan
+    pitch = np.empty((height, width, 3), dtype=np.uint8)
+    stripe = max(width // 24, 1)
+    for stripe_idx, x in enumerate(range(0, width, stripe)):
+        pitch[:, x:x + stripe] = GRASS_COLORS[stripe_idx % 2]
+    line = max(height // 270, 1)
+    margin = height // 12
+    cv.rectangle(pitch, (margin, margin), (width - margin, height - margin), (235, 235, 235), line)
+    for x in range(width // 6, width, width // 3):
+        cv.line(pitch, (x, margin), (x, height - margin), (235, 235, 235), line)
+        cv.circle(pitch, (x, height // 2), height // 8, (235, 235, 235), line)
+    return pitch
+
+
+class SyntheticMatch:
+    # A panning camera over a pitch with two teams, goalkeepers, a referee and a ball passed between players.
+    # Frames come with ground-truth boxes that double as canned detections: slightly jittered, with the
+    # ball sometimes missed and sometimes duplicated by a spurious detection.
+    def __init__(self, num_frames=250, width=1280, height=720, players_per_team=10, pan_speed=None, seed=0):
+        self.num_frames = num_frames
+        self.width = width
+        self.height = height
+        self.rng = np.random.default_rng(seed)
+        self.pan_speed = width / 640 if pan_speed is None else pan_speed
+        self.pitch = draw_pitch(width + int(np.ceil(self.pan_speed * num_frames)) + 1, height)
+
+        self.box_size = np.array([height / 27, height / 13.5])
+        num_players = 2 * players_per_team
+        # players, then the two goalkeepers, then the referee
+        self.colors = [TEAM_COLORS[idx // players_per_team] for idx in range(num_players)]
+        self.colors += [GOALKEEPER_COLOR, GOALKEEPER_COLOR, REFEREE_COLOR]
+        self.class_ids = [2] * num_players + [1, 1, 3]
+        # Players are kept in view (in image coordinates) while the pitch pans underneath them
+        low, high = self.box_size, np.array([width, height]) - self.box_size
+        self.positions = self.rng.uniform(low, high, size=(len(self.colors), 2))
+        self.velocities = self.rng.normal(0, height / 360, size=(len(self.colors), 2))
+        self.bounds = (low, high)
+
+        self.holder = 0
+        self.ball = self.positions[0].copy()
+        self.pass_frames_left = 0
+
+    def _step(self):
+        low, high = self.bounds
+        self.velocities += self.rng.normal(0, self.height / 3600, size=self.velocities.shape)
+        self.positions += self.velocities
+        bounced = (self.positions < low) | (self.positions > high)
+        self.velocities[bounced] *= -1
+        np.clip(self.positions, low, high, out=self.positions)
+
+        # The ball sits at the holder's feet, and every so often travels to another outfield player
+        feet = self.positions[self.holder] + [self.box_size[0] * 0.6, self.box_size[1] * 0.45]
+        if self.pass_frames_left == 0 and self.rng.random() < 0.03:
+            self.holder = int(self.rng.integers(0, len(self.colors) - 3))
+            self.pass_frames_left = 12
+        if self.pass_frames_left:
+            self.ball += (feet - self.ball) / self.pass_frames_left
+            self.pass_frames_left -= 1
+        else:
+            self.ball = feet
+
+    def frames(self):
+        # Yields (frame, detections) pairs
+        half = self.box_size / 2
+        ball_radius = max(int(self.height / 180), 2)
+        for frame_num in range(self.num_frames):
+            self._step()
+            offset = int(self.pan_speed * frame_num)
+            frame = self.pitch[:, offset:offset + self.width].copy()
+
+            boxes, class_ids = [], []
+            for position, color, class_id in zip(self.positions, self.colors, self.class_ids):
+                x, y = position
+                x1, y1, x2, y2 = int(x - half[0]), int(y - half[1]), int(x + half[0]), int(y + half[1])
+                cv.rectangle(frame, (x1, y1), (x2, y2), color, -1)
+                cv.rectangle(frame, (x1, (y1 + y2) // 2), (x2, y2), SHORTS_COLOR, -1)
+                boxes.append([x1, y1, x2, y2])
+                class_ids.append(class_id)
+
+            ball_x, ball_y = int(self.ball[0]), int(self.ball[1])
+            cv.circle(frame, (ball_x, ball_y), ball_radius, (255, 255, 255), -1)
+            if self.rng.random() > 0.15:
+                boxes.append([ball_x - ball_radius, ball_y - ball_radius, ball_x + ball_radius, ball_y + ball_radius])
+                class_ids.append(0)
+            if self.rng.random() < 0.05:
+                spurious = self.rng.uniform([0, 0], [self.width, self.height])
+                boxes.append([*(spurious - ball_radius), *(spurious + ball_radius)])
+                class_ids.append(0)
+
+            boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+            boxes += self.rng.normal(0, 1, size=boxes.shape).astype(np.float32)
+            detections = sv.Detections(
+                xyxy=boxes,
+                confidence=self.rng.uniform(0.5, 0.95, size=len(boxes)).astype(np.float32),
+                class_id=np.asarray(class_ids, dtype=int),
+            )
+            yield frame, detections
+
+
+def write_synthetic_video(video_path, num_frames=250, width=1280, height=720, fps=25, seed=0):
+    # Writes the synthetic match to video_path and returns its canned detections, one sv.Detections per frame
+    match = SyntheticMatch(num_frames, width, height, seed=seed)
+    writer = cv.VideoWriter(video_path, cv.VideoWriter_fourcc(*"MJPG"), fps, (width, height))
+    detections = []
+    for frame, frame_detections in match.frames():
+        writer.write(frame)
+        detections.append(frame_detections)
+    writer.release()
+    return detections
+
+
+def save_canned_detections(path, detections):
+    frame = np.repeat(np.arange(len(detections)), [len(detection) for detection in detections])
+    np.savez(
+        path,
+        num_frames=np.array(len(detections)),
+        frame=frame,
+        xyxy=np.concatenate([detection.xyxy for detection in detections]).reshape(-1, 4),
+        confidence=np.concatenate([detection.confidence for detection in detections]),
+        class_id=np.concatenate([detection.class_id for detection in detections]),
+        class_names=np.array([CLASS_NAMES[idx] for idx in sorted(CLASS_NAMES)]),
+    )
+
+
+def load_canned_detections(path):
+    arrays = np.load(path)
+    num_frames = int(arrays["num_frames"])
+    offsets = np.searchsorted(arrays["frame"], np.arange(num_frames + 1))
+    detections = [
+        sv.Detections(
+            xyxy=arrays["xyxy"][offsets[idx]:offsets[idx + 1]],
+            confidence=arrays["confidence"][offsets[idx]:offsets[idx + 1]],
+            class_id=arrays["class_id"][offsets[idx]:offsets[idx + 1]],
+        )
+        for idx in range(num_frames)
+    ]
+    class_names = {idx: str(name) for idx, name in enumerate(arrays["class_names"])}
+    return detections, class_names
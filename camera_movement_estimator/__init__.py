@@ -1 +1 @@
-from .camera_movement_estimator import CameraMovementEstimator
\ No newline at end of file
+from .camera_movement_estimator import CameraMovementEstimator, RefreshRecorder
\ No newline at end of file
@@ -1,25 +1,68 @@
-import pickle
+import hashlib
 import cv2
 import numpy as np
-import os
 import sys 
+from concurrent.futures import ProcessPoolExecutor
 sys.path.append('../')
-from utils import measure_distance,measure_xy_distance
+from utils import read_stub,save_stub,iter_video,get_video_properties,draw_camera_movement_panel,frame_context
+from profiler import NULL_PROFILER
+
+# Bump when the camera movement algorithm changes so cached results are not reused
+CAMERA_MOVEMENT_CACHE_VERSION = 2
+
+MOTION_METHODS = ("max", "median", "affine")
+
+
+class RefreshRecorder:
+    # Stands in for an estimator and notes the frames on which it detected features again, so the seam
+    # of an independently estimated chunk can be resynced (CameraMovementEstimator.resync_chunk)
+    def __init__(self, estimator, first_frame_num=0):
+        self.estimator = estimator
+        self.frame_num = first_frame_num
+        self.refresh_frames = []
+
+    def update(self, frame):
+        features = self.estimator.old_features
+        camera_movement = self.estimator.update(frame)
+        if self.estimator.old_features is not features:
+            self.refresh_frames.append(self.frame_num)
+        self.frame_num += 1
+        return camera_movement
+
+
+def _camera_movement_chunk(estimator, video_path, start, stop, overlap):
+    # Runs in a worker process: warms up on `overlap` frames before the chunk, then drops them. Also returns
+    # the frames of the chunk on which features were detected again, where the seam check can resync
+    warmup_start = max(0, start - overlap)
+    estimator.reset()
+    recorder = RefreshRecorder(estimator, warmup_start)
+    camera_movement = [recorder.update(frame) for frame in iter_video(video_path, warmup_start, stop)]
+    return camera_movement[start - warmup_start:], [frame for frame in recorder.refresh_frames if frame >= start]
+
 
 class CameraMovementEstimator():
-    def __init__(self,frame):
+    def __init__(self,frame, method="max", downscale_width=None, profiler=None):
+        if method not in MOTION_METHODS:
+            raise ValueError(f"Unknown camera motion method {method!r}, expected one of {MOTION_METHODS}")
+        self.method = method
+        self.profiler = profiler or NULL_PROFILER
         self.minimum_distance = 5
 
+        # Optical flow runs on frames downscaled to downscale_width; movements are scaled back to full resolution
+        frame_width = frame.shape[1]
+        self.scale = downscale_width / frame_width if downscale_width and downscale_width < frame_width else 1.0
+
         self.lk_params = dict(
             winSize = (15,15),
             maxLevel = 2,
             criteria = (cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT,10,0.03)
         )
 
-        first_frame_grayscale = cv2.cvtColor(frame,cv2.COLOR_BGR2GRAY)
-        mask_features = np.zeros_like(first_frame_grayscale)
+        mask_features = np.zeros(frame.shape[:2], dtype=np.uint8)
         mask_features[:,0:20] = 1
         mask_features[:,900:1050] = 1
+        if self.scale != 1.0:
+            mask_features = cv2.resize(mask_features, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_NEAREST)
 
         self.features = dict(
             maxCorners = 100,
@@ -28,6 +71,7 @@ class CameraMovementEstimator():
             blockSize = 7,
             mask = mask_features
         )
+        self.reset()
         
     def _adjust_positions_to_tracks(self, tracks, camera_movement_per_frame):
         for object, object_tracks in tracks.items():
@@ -39,6 +83,10 @@ class CameraMovementEstimator():
                     tracks[object][frame_num][track_id]["position_adjusted"] = position_adjusted
 
     def add_adjust_positions_to_tracks(self,tracks, camera_movement_per_frame):
+        # A TrackTable adjusts all rows in one vectorized operation
+        if hasattr(tracks, "add_adjusted_positions"):
+            tracks.add_adjusted_positions(camera_movement_per_frame)
+            return
         for object, object_tracks in tracks.items():
             for frame_num, track in enumerate(object_tracks):
                 for track_id, track_info in track.items():
@@ -49,60 +97,187 @@ class CameraMovementEstimator():
                     
 
 
-    def get_camera_movement(self,frames,read_from_stub=False, stub_path=None):
-        # Read the stub 
-        if read_from_stub and stub_path is not None and os.path.exists(stub_path):
-            with open(stub_path,'rb') as f:
-                return pickle.load(f)
+    def reset(self):
+        self.old_gray = None
+        self.old_features = None
 
-        camera_movement = [[0,0]]*len(frames)
+    def _to_gray(self, frame):
+        # frame may be a FrameContext, whose grayscale copies are shared with other stages
+        return frame_context(frame).gray(self.features["mask"].shape[::-1] if self.scale != 1.0 else None)
 
-        old_gray = cv2.cvtColor(frames[0],cv2.COLOR_BGR2GRAY)
-        old_features = cv2.goodFeaturesToTrack(old_gray,**self.features)
+    def estimate_motion(self, old_points, new_points, status):
+        # Returns the (x, y) camera movement and the distance compared against minimum_distance,
+        # computed over all feature points at once
+        displacement = old_points - new_points
+        if self.method == "max":
+            distances = np.hypot(displacement[:, 0], displacement[:, 1])
+            idx = int(np.argmax(distances))
+            return displacement[idx], distances[idx]
 
-        for frame_num in range(1,len(frames)):
-            frame_gray = cv2.cvtColor(frames[frame_num],cv2.COLOR_BGR2GRAY)
-            new_features, _,_ = cv2.calcOpticalFlowPyrLK(old_gray,frame_gray,old_features,None,**self.lk_params)
+        tracked = status.astype(bool)
+        if not tracked.any():
+            return np.zeros(2, dtype=np.float32), 0.0
+        movement = np.median(displacement[tracked], axis=0)
+        if self.method == "affine" and tracked.sum() >= 3:
+            matrix, _ = cv2.estimateAffinePartial2D(new_points[tracked], old_points[tracked], method=cv2.RANSAC)
+            if matrix is not None:
+                # Movement of the image center under the fitted similarity transform
+                height, width = self.features["mask"].shape
+                center = np.array([width / 2, height / 2, 1.0])
+                movement = matrix @ center - center[:2]
+        return movement, float(np.hypot(movement[0], movement[1]))
 
-            max_distance = 0
-            camera_movement_x, camera_movement_y = 0,0
+    def update(self, frame):
+        with self.profiler.stage("camera_movement"):
+            return self._update(frame)
 
-            for i, (new,old) in enumerate(zip(new_features,old_features)):
-                new_features_point = new.ravel()
-                old_features_point = old.ravel()
+    def _update(self, frame):
+        # Estimates the movement of a single frame against the previous one passed in
+        frame_gray = self._to_gray(frame)
 
-                distance = measure_distance(new_features_point,old_features_point)
-                if distance>max_distance:
-                    max_distance = distance
-                    camera_movement_x,camera_movement_y = measure_xy_distance(old_features_point, new_features_point ) 
-            
-            if max_distance > self.minimum_distance:
-                camera_movement[frame_num] = [camera_movement_x,camera_movement_y]
-                old_features = cv2.goodFeaturesToTrack(frame_gray,**self.features)
+        if self.old_gray is None or self.old_features is None:
+            self.old_gray = frame_gray
+            self.old_features = cv2.goodFeaturesToTrack(frame_gray,**self.features)
+            return [0,0]
 
-            old_gray = frame_gray.copy()
-        
-        if stub_path is not None:
-            with open(stub_path,'wb') as f:
-                pickle.dump(camera_movement,f)
+        camera_movement = [0,0]
+        new_features, status, _ = cv2.calcOpticalFlowPyrLK(self.old_gray,frame_gray,self.old_features,None,**self.lk_params)
+
+        movement, distance = self.estimate_motion(self.old_features.reshape(-1, 2), new_features.reshape(-1, 2), status.ravel())
+
+        if distance > self.minimum_distance * self.scale:
+            camera_movement = (movement / self.scale).tolist()
+            self.old_features = cv2.goodFeaturesToTrack(frame_gray,**self.features)
+
+        self.old_gray = frame_gray
+        return camera_movement
+
+    def propagate_boxes(self, old_gray, new_gray, boxes, grid=3):
+        # Moves boxes from old_gray to new_gray by the median LK flow of a grid of points inside each box.
+        # Returns the moved boxes, the fraction of each box's points that were tracked and the median
+        # motion over all points, all from a single calcOpticalFlowPyrLK call.
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        if len(boxes) == 0:
+            return boxes, np.zeros(0, dtype=np.float32), np.zeros(2, dtype=np.float32)
+
+        steps = np.linspace(0.2, 0.8, grid, dtype=np.float32)
+        xs = boxes[:, 0, None] + (boxes[:, 2] - boxes[:, 0])[:, None] * steps
+        ys = boxes[:, 1, None] + (boxes[:, 3] - boxes[:, 1])[:, None] * steps
+        points = np.stack(np.broadcast_arrays(xs[:, None, :], ys[:, :, None]), axis=-1).reshape(-1, 1, 2)
+
+        new_points, status, _ = cv2.calcOpticalFlowPyrLK(old_gray, new_gray, points, None, **self.lk_params)
+        displacement = (new_points - points).reshape(len(boxes), grid * grid, 2)
+        tracked = status.reshape(len(boxes), grid * grid).astype(bool)
+
+        displacement = np.where(tracked[..., None], displacement, np.nan)
+        tracked_fraction = tracked.mean(axis=1)
+        box_motion = np.zeros((len(boxes), 2), dtype=np.float32)
+        has_points = tracked.any(axis=1)
+        box_motion[has_points] = np.nanmedian(displacement[has_points], axis=1)
+        scene_motion = np.nanmedian(displacement[tracked], axis=0) if tracked.any() else np.zeros(2, dtype=np.float32)
+        return boxes + np.tile(box_motion, 2), tracked_fraction, scene_motion
+
+    def cache_key(self, cache, video_path):
+        features = {key: value for key, value in self.features.items() if key != "mask"}
+        features["mask"] = hashlib.sha256(np.ascontiguousarray(self.features["mask"])).hexdigest()
+        return cache.key("camera_movement", version=CAMERA_MOVEMENT_CACHE_VERSION, video=cache.file_hash(video_path),
+                         lk_params=self.lk_params, features=features, minimum_distance=self.minimum_distance,
+                         method=self.method, scale=self.scale)
+
+    def load_cached_camera_movement(self, cache, video_path, frame_range=None):
+        start, stop = frame_range or (0, None)
+        entry = cache.load("camera_movement", self.cache_key(cache, video_path), start, stop)
+        if entry is None:
+            return None
+        return np.array(entry.arrays["camera_movement"][entry.frame_slice(start, stop)]).tolist()
+
+    def save_cached_camera_movement(self, cache, video_path, camera_movement, frame_range=None):
+        start, stop = frame_range or (0, None)
+        cache.save("camera_movement", self.cache_key(cache, video_path),
+                   {"camera_movement": np.asarray(camera_movement, dtype=np.float32).reshape(-1, 2)},
+                   start, stop, num_frames=len(camera_movement))
+
+    def resync_chunk(self, video_path, last_refresh, chunk_start, chunk_stop, camera_movement, refresh_frames):
+        # The serial estimate of a frame depends on the previous frame and on the features detected at the
+        # last refresh before it. Reruns the start of a chunk from the state the previous chunk ended in,
+        # up to the first frame where the chunk's own run refreshed too: from there on both runs are in the
+        # same state and the chunk's results are exact. Returns the chunk's last refresh frame.
+        self.reset()
+        self.old_features = cv2.goodFeaturesToTrack(
+            self._to_gray(next(iter_video(video_path, last_refresh, last_refresh + 1))), **self.features)
+        frames = iter_video(video_path, chunk_start - 1, chunk_stop)
+        self.old_gray = self._to_gray(next(frames))
+        chunk_refreshes = set(refresh_frames)
+        for frame_num, frame in enumerate(frames, chunk_start):
+            features = self.old_features
+            camera_movement[frame_num - chunk_start] = self.update(frame)
+            if self.old_features is not features:
+                if frame_num in chunk_refreshes:
+                    return refresh_frames[-1]
+                last_refresh = frame_num
+        return last_refresh
+
+    def get_camera_movement_parallel(self, video_path, workers, chunk_size=500, overlap=5, frame_range=None):
+        # Splits the video into chunks estimated in a process pool; each chunk decodes its own frames
+        # and warms up on `overlap` frames before its start. The start of every chunk is then checked
+        # against the state the previous chunk ended in, so the result matches the serial estimate.
+        start, stop = frame_range or (0, None)
+        if stop is None:
+            stop = get_video_properties(video_path)["frame_count"]
+        chunk_starts = list(range(start, stop, chunk_size))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(_camera_movement_chunk, self, video_path, chunk_start,
+                                min(chunk_start + chunk_size, stop), overlap if chunk_start > start else 0)
+                for chunk_start in chunk_starts
+            ]
+            camera_movement = []
+            last_refresh = None
+            for chunk_start, future in zip(chunk_starts, futures):
+                chunk_movement, refresh_frames = future.result()
+                if last_refresh is None:
+                    # The first chunk starts fresh, exactly like the serial estimate
+                    last_refresh = refresh_frames[-1] if refresh_frames else start
+                else:
+                    last_refresh = self.resync_chunk(video_path, last_refresh, chunk_start,
+                                                     chunk_start + len(chunk_movement), chunk_movement, refresh_frames)
+                camera_movement += chunk_movement
+        self.reset()
+        return camera_movement
+
+    def get_camera_movement(self,frames,read_from_stub=False, stub_path=None,
+                            cache=None, video_path=None, frame_range=None, workers=1):
+        # Read the stub 
+        camera_movement = read_stub(read_from_stub, stub_path)
+        if camera_movement is not None:
+            return camera_movement
+
+        use_cache = cache is not None and video_path is not None
+        if use_cache:
+            camera_movement = self.load_cached_camera_movement(cache, video_path, frame_range)
+            if camera_movement is not None:
+                return camera_movement
+
+        if workers > 1 and video_path is not None:
+            camera_movement = self.get_camera_movement_parallel(video_path, workers, frame_range=frame_range)
+        else:
+            self.reset()
+            camera_movement = [self.update(frame) for frame in frames]
+
+        save_stub(stub_path, camera_movement)
+        if use_cache:
+            self.save_cached_camera_movement(cache, video_path, camera_movement, frame_range)
 
         return camera_movement
     
+    def draw_frame_camera_movement(self, frame, camera_movement):
+        return draw_camera_movement_panel(frame, camera_movement)
+
     def draw_camera_movement(self,frames, camera_movement_per_frame):
         output_frames=[]
 
         for frame_num, frame in enumerate(frames):
-            frame= frame.copy()
-
-            overlay = frame.copy()
-            cv2.rectangle(overlay,(0,0),(500,100),(255,255,255),-1)
-            alpha =0.6
-            cv2.addWeighted(overlay,alpha,frame,1-alpha,0,frame)
-
-            x_movement, y_movement = camera_movement_per_frame[frame_num]
-            frame = cv2.putText(frame,f"Camera Movement X: {x_movement:.2f}",(10,30), cv2.FONT_HERSHEY_SIMPLEX,1,(0,0,0),3)
-            frame = cv2.putText(frame,f"Camera Movement Y: {y_movement:.2f}",(10,60), cv2.FONT_HERSHEY_SIMPLEX,1,(0,0,0),3)
-
+            frame = self.draw_frame_camera_movement(frame.copy(), camera_movement_per_frame[frame_num])
             output_frames.append(frame) 
 
         return output_frames
\ No newline at end of file
@@ -1,90 +1,159 @@
 import sys
-import os
+import argparse
 sys.path.append("../")  # Ensure that the path is correctly pointing to the parent directory
-from utils import read_video, save_video
-import numpy as np
-import cv2 as cv
+from utils import iter_video, save_video, get_video_properties
 from trackers import Tracker
 from team_assigner import TeamAssigner
 from player_ball_assigner import PlayerBallAssigner
 from camera_movement_estimator import CameraMovementEstimator
+from stage_cache import StageCache
+from annotation_renderer import AnnotationRenderer
+from view_transformer import ViewTransformer
+from speed_and_distance_estimator import SpeedAndDistanceEstimator
+from profiler import StageProfiler, NULL_PROFILER
+from pipeline import assign_player_teams, assign_ball_possession, build_track_table, run_streaming_pipeline, run_segment_parallel_pipeline, run_live_pipeline
+
+VIDEO_PATH = r"A:\ProgrmmingStuff\Football-Analysis\input_videos\08fd33_4.mp4"
+MODEL_PATH = r"A:\ProgrmmingStuff\Football-Analysis\models\best.pt"
+TRACK_STUB_PATH = r"A:\ProgrmmingStuff\Football-Analysis\stubs\track_stubs.pkl"
+CAMERA_MOVEMENT_STUB_PATH = r"A:\ProgrmmingStuff\Football-Analysis\stubs\camera_movement_stub.pkl"
+OUTPUT_PATH = r"A:\ProgrmmingStuff\Football-Analysis\output_videos\output.avi"
+
+def main(stream=False, cache_dir=None, writer_options=None, keyframe_interval=None, model_path=MODEL_PATH, backend=None,
+         workers=1, segment_length=None, metrics_path=None, trace_path=None, live=False, latency_budget_ms=200.0):
+    video_path = VIDEO_PATH
+    output_path = OUTPUT_PATH
+
+    # Per-stage timings are only collected when a metrics or trace file is asked for
+    profiler = StageProfiler(trace=trace_path is not None) if metrics_path or trace_path else NULL_PROFILER
+    if live:
+        # Online mode: frames are analyzed and written as they arrive, paced like a live feed
+        tracker = Tracker(model_path, keyframe_interval=keyframe_interval, backend=backend, profiler=profiler)
+        report = run_live_pipeline(video_path, output_path, tracker, latency_budget_ms,
+                                   writer_options=writer_options, profiler=profiler)
+        print(f"Output video saved to {output_path}")
+        if report["frames"]:
+            print(f"Latency over {report['frames']} frames: p50 {report['p50_ms']:.0f} ms, p95 {report['p95_ms']:.0f} ms, "
+                  f"max {report['max_ms']:.0f} ms; {report['over_budget']} over the {latency_budget_ms:.0f} ms budget, "
+                  f"{report['dropped_frames']} frames dropped")
+    else:
+        run(video_path, output_path, stream, cache_dir, writer_options, keyframe_interval, model_path, backend,
+            workers, segment_length, profiler)
+
+    if profiler.enabled:
+        print(profiler.report())
+        if metrics_path:
+            profiler.save_metrics(metrics_path)
+        if trace_path:
+            profiler.save_chrome_trace(trace_path)
+
+def run(video_path, output_path, stream, cache_dir, writer_options, keyframe_interval, model_path, backend,
+        workers, segment_length, profiler):
+    # Pitch coordinates in metres, and from them each player's speed and distance covered
+    view_transformer = ViewTransformer()
+    speed_estimator = SpeedAndDistanceEstimator(fps=get_video_properties(video_path)["fps"])
+
+    if workers > 1:
+        # Time segments are tracked in separate processes and their track ids stitched back together
+        tracks = run_segment_parallel_pipeline(video_path, output_path, model_path, workers, segment_length,
+                                               tracker_kwargs={"keyframe_interval": keyframe_interval, "backend": backend},
+                                               writer_options=writer_options, profiler=profiler,
+                                               view_transformer=view_transformer, speed_estimator=speed_estimator)
+        if tracks is not None:
+            print(f"Output video saved to {output_path}")
+        return
+
+    tracker = Tracker(model_path, keyframe_interval=keyframe_interval, backend=backend, profiler=profiler)
+
+    # The content-addressed stage cache replaces the legacy pickle stubs when enabled
+    cache = StageCache(cache_dir) if cache_dir else None
+    use_stubs = cache is None
+
+    if stream:
+        # Bounded-memory mode: frames are decoded lazily and written as soon as they are annotated
+        tracks = run_streaming_pipeline(video_path, output_path, tracker,
+                                        read_from_stub=use_stubs,
+                                        track_stub_path=TRACK_STUB_PATH if use_stubs else None,
+                                        camera_stub_path=CAMERA_MOVEMENT_STUB_PATH if use_stubs else None,
+                                        cache=cache,
+                                        writer_options=writer_options,
+                                        profiler=profiler,
+                                        view_transformer=view_transformer,
+                                        speed_estimator=speed_estimator)
+        if tracks is not None:
+            print(f"Output video saved to {output_path}")
+        return
+
+    video_frames = list(profiler.iterate("decode", iter_video(video_path)))
 
-def main():
-    video_path = r"A:\ProgrmmingStuff\Football-Analysis\input_videos\08fd33_4.mp4"
-    video_frames = read_video(video_path)
-    
     # Ensure the video frames are loaded correctly
     if video_frames is None or len(video_frames) == 0:
         print(f"Failed to load video from {video_path}")
         return
-    
-    # Initialize the tracker and get object tracks
-    tracker = Tracker(r"A:\ProgrmmingStuff\Football-Analysis\models\best.pt")
+
+    # Get object tracks
     tracks = tracker.get_object_tracks(video_frames,
-                                       read_from_stub=True,
-                                       stub_path=r"A:\ProgrmmingStuff\Football-Analysis\stubs\track_stubs.pkl")
-    
-    tracker.add_position_to_tracks(tracks)
-    
+                                       read_from_stub=use_stubs,
+                                       stub_path=TRACK_STUB_PATH if use_stubs else None,
+                                       cache=cache,
+                                       video_path=video_path)
+
     # Check if tracks were successfully loaded
     if not tracks:
         print("Failed to load tracks.")
         return
-    
+
     # Estimate camera movement
-    camera_movement_estimator = CameraMovementEstimator(video_frames[0])
+    camera_movement_estimator = CameraMovementEstimator(video_frames[0], profiler=profiler)
     camera_movement_per_frame = camera_movement_estimator.get_camera_movement(
         video_frames,
-        read_from_stub=True,
-        stub_path=r"A:\ProgrmmingStuff\Football-Analysis\stubs\camera_movement_stub.pkl"
+        read_from_stub=use_stubs,
+        stub_path=CAMERA_MOVEMENT_STUB_PATH if use_stubs else None,
+        cache=cache,
+        video_path=video_path
     )
-    
-    camera_movement_estimator.add_adjust_positions_to_tracks(tracks, camera_movement_per_frame)
-    
-    # Interpolate ball positions
-    tracks["ball"] = tracker.interpolate_ball_positions(tracks["ball"])
-    
-    # Assign teams and team colors
-    team_assigner = TeamAssigner()
-    team_assigner.assign_team_color(video_frames[0], tracks['players'][0])
-    
-    # Assign team to each player
-    for frame_num, player_track in enumerate(tracks["players"]):
-        for player_id, track in player_track.items():
-            team = team_assigner.get_player_team(
-                video_frames[frame_num],
-                track["box"],
-                player_id
-            )
-            tracks["players"][frame_num][player_id]["team"] = team
-            tracks["players"][frame_num][player_id]["team_color"] = team_assigner.team_colors[team]
-    
+
+    # Assign teams and team colors to each player
+    team_assigner = TeamAssigner(profiler=profiler)
+    for frame_num, frame in enumerate(video_frames):
+        assign_player_teams(team_assigner, frame, tracks["players"][frame_num])
+
+    # Interpolate ball positions and move tracks into the columnar table, adding positions,
+    # camera-adjusted positions, teams, pitch positions, speed and distance as vectorized operations
+    tracks = build_track_table(tracks, camera_movement_per_frame, team_assigner, profiler,
+                               view_transformer, speed_estimator)
+
     # Assign ball to the player
-    player_assigner = PlayerBallAssigner()
-    team_ball_control = []
-    for frame_num, player_track in enumerate(tracks["players"]):
-        ball_box = tracks["ball"][frame_num][1]["box"]
-        assigned_player = player_assigner.assign_ball_to_player(player_track, ball_box)
-        
-        if assigned_player != -1:
-            tracks["players"][frame_num][assigned_player]["has_ball"] = True
-            team_ball_control.append(tracks["players"][frame_num][assigned_player]["team"])
-        else:
-            # If no player is assigned, keep the previous ball control
-            team_ball_control.append(team_ball_control[-1] if team_ball_control else None)
-    
-    team_ball_control = np.array(team_ball_control)
-    
-    # Draw annotations on video frames
-    video_frames = tracker.draw_annotations(video_frames, tracks, team_ball_control)
-    
-    # Overlay camera movement on frames
-    video_frames = camera_movement_estimator.draw_camera_movement(video_frames, camera_movement_per_frame)
-    
+    team_ball_control = assign_ball_possession(tracks, PlayerBallAssigner(), profiler=profiler)
+
+    # Draw track annotations, ball control and camera movement in place, in one parallel pass that
+    # feeds the background writer directly, so drawing overlaps encoding
+    renderer = AnnotationRenderer(tracks, team_ball_control, camera_movement_per_frame, profiler=profiler)
+
     # Save the final video with annotations
-    output_path = r"A:\ProgrmmingStuff\Football-Analysis\output_videos\output.avi"
-    save_video(video_frames, output_path)
+    save_video(renderer.render(video_frames), output_path, fps=get_video_properties(video_path)["fps"], profiler=profiler,
+               **(writer_options or {}))
     print(f"Output video saved to {output_path}")
-     
+
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Football analysis")
+    parser.add_argument("--stream", action="store_true", help="decode, process and write frames lazily with bounded memory")
+    parser.add_argument("--cache-dir", help="directory of the content-addressed stage cache (replaces the pickle stubs)")
+    parser.add_argument("--codec", help="fourcc of the output video, chosen from the container extension by default")
+    parser.add_argument("--preview-scale", type=float, default=1.0, help="scale of the output frames for a fast preview")
+    parser.add_argument("--frame-stride", type=int, default=1, help="write only every n-th frame for a fast preview")
+    parser.add_argument("--keyframe-interval", type=int, help="run the detector every n frames and propagate boxes with optical flow in between")
+    parser.add_argument("--model", default=MODEL_PATH, help="detector weights (.pt) or exported graph (.onnx)")
+    parser.add_argument("--backend", choices=["ultralytics", "onnxruntime"], help="detector backend, chosen from the model extension by default")
+    parser.add_argument("--workers", type=int, default=1, help="process overlapping time segments of the video in this many processes")
+    parser.add_argument("--segment-length", type=int, help="frames per segment with --workers, the video split evenly by default")
+    parser.add_argument("--profile", metavar="METRICS_JSON", help="write per-stage timings, fps, latency histograms and peak RSS to this file")
+    parser.add_argument("--trace", metavar="TRACE_JSON", help="write a Chrome trace (chrome://tracing, Perfetto) of every timed stage call")
+    parser.add_argument("--live", action="store_true", help="analyze frames online as they arrive and report per-frame latency")
+    parser.add_argument("--latency-budget-ms", type=float, default=200.0, help="per-frame end-to-end latency target of --live")
+    args = parser.parse_args()
+    writer_options = {"codec": args.codec, "preview_scale": args.preview_scale, "frame_stride": args.frame_stride}
+    main(stream=args.stream, cache_dir=args.cache_dir, writer_options=writer_options,
+         keyframe_interval=args.keyframe_interval, model_path=args.model, backend=args.backend,
+         workers=args.workers, segment_length=args.segment_length, metrics_path=args.profile, trace_path=args.trace,
+         live=args.live, latency_budget_ms=args.latency_budget_ms)
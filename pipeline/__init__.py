@@ -0,0 +1,3 @@
+from .video_pipeline import assign_player_teams, assign_ball_possession, build_track_table, add_pitch_metrics, analyze_frames, render_video, process_video, run_streaming_pipeline
+from .segment_parallel import process_video_segments, run_segment_parallel_pipeline
+from .live_pipeline import LiveFrameSource, LivePipeline, run_live_pipeline
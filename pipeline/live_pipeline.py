@@ -0,0 +1,224 @@
+import threading
+import time
+import sys
+from collections import deque
+sys.path.append("../")
+import numpy as np
+import cv2 as cv
+from utils import FrameContext, BackgroundVideoWriter, get_video_properties
+from team_assigner import TeamAssigner
+from player_ball_assigner import PlayerBallAssigner, PossessionStats
+from camera_movement_estimator import CameraMovementEstimator
+from trackers import StreamingBallInterpolator
+from annotation_renderer import draw_frame_overlays
+from .video_pipeline import assign_player_teams
+
+
+class LiveFrameSource:
+    # Reads a file, device index or stream URL on a thread the way a live feed arrives: paced at the
+    # source fps when realtime, into a small buffer that drops the oldest frame when processing falls
+    # behind. Without realtime every frame is kept and the reader waits for room in the buffer instead.
+    # Yields (frame, arrival_time) with arrival_time on the time.perf_counter clock.
+    def __init__(self, source, realtime=True, fps=None, buffer_size=2):
+        self.source = source
+        self.realtime = realtime
+        self.fps = fps
+        self.buffer_size = buffer_size
+        self.dropped_frames = 0
+        self._buffer = deque()
+        self._condition = threading.Condition()
+        self._finished = False
+        self._stopped = False
+
+    def _read(self):
+        cap = cv.VideoCapture(self.source)
+        fps = self.fps or cap.get(cv.CAP_PROP_FPS) or 25.0
+        start = time.perf_counter()
+        frame_num = 0
+        try:
+            while not self._stopped:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                if self.realtime:
+                    delay = start + frame_num / fps - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                with self._condition:
+                    while not self.realtime and len(self._buffer) >= self.buffer_size and not self._stopped:
+                        self._condition.wait()
+                    if len(self._buffer) >= self.buffer_size:
+                        self._buffer.popleft()
+                        self.dropped_frames += 1
+                    self._buffer.append((frame, time.perf_counter()))
+                    self._condition.notify_all()
+                frame_num += 1
+        finally:
+            cap.release()
+            with self._condition:
+                self._finished = True
+                self._condition.notify_all()
+
+    def __iter__(self):
+        thread = threading.Thread(target=self._read, daemon=True)
+        thread.start()
+        try:
+            while True:
+                with self._condition:
+                    while not self._buffer and not self._finished:
+                        self._condition.wait()
+                    if not self._buffer:
+                        return
+                    item = self._buffer.popleft()
+                    self._condition.notify_all()
+                yield item
+        finally:
+            with self._condition:
+                self._stopped = True
+                self._condition.notify_all()
+            thread.join()
+
+
+class LatencyReport:
+    # End-to-end latency of every emitted frame, from its arrival to its annotated output, against a budget
+    def __init__(self, budget_ms):
+        self.budget_ms = budget_ms
+        self.latencies_ms = []
+
+    def record(self, latency_ms):
+        self.latencies_ms.append(latency_ms)
+
+    def summary(self):
+        latencies = np.asarray(self.latencies_ms, dtype=np.float64)
+        if len(latencies) == 0:
+            return {"frames": 0, "budget_ms": self.budget_ms}
+        over_budget = int((latencies > self.budget_ms).sum())
+        return {
+            "frames": len(latencies),
+            "budget_ms": self.budget_ms,
+            "mean_ms": float(latencies.mean()),
+            "p50_ms": float(np.percentile(latencies, 50)),
+            "p95_ms": float(np.percentile(latencies, 95)),
+            "p99_ms": float(np.percentile(latencies, 99)),
+            "max_ms": float(latencies.max()),
+            "over_budget": over_budget,
+            "over_budget_fraction": over_budget / len(latencies),
+        }
+
+
+class LivePipeline:
+    # Online version of the analysis: every frame is detected, tracked, motion-estimated and team-voted
+    # as it arrives. Team colors are fitted on the first frame with players, the ball path is filled with
+    # a window of at most ball_max_gap frames and possession is accumulated frame by frame. A frame is
+    # emitted as soon as its ball box is final, so output lags input by at most ball_max_gap frames.
+    def __init__(self, tracker, latency_budget_ms=200.0, ball_max_gap=5, camera_kwargs=None, profiler=None):
+        self.tracker = tracker
+        self.tracker.reset_tracking()
+        # Load the model now, so it is not counted in the first frame's latency or cause realtime frame drops
+        self.tracker.backend
+        self.team_assigner = TeamAssigner(profiler=profiler)
+        self.player_assigner = PlayerBallAssigner()
+        self.possession_stats = PossessionStats()
+        self.ball_interpolator = StreamingBallInterpolator(ball_max_gap)
+        self.camera_kwargs = camera_kwargs or {}
+        self.profiler = profiler
+        self.camera_movement_estimator = None
+        self.latency = LatencyReport(latency_budget_ms)
+        self.pending = deque()
+        self.frame_num = 0
+        self.team_in_control = 0
+
+    def process(self, frame, arrival_time=None):
+        # Feeds one frame; returns the (annotated_frame, frame_stats) pairs that became final
+        arrival_time = time.perf_counter() if arrival_time is None else arrival_time
+        context = FrameContext(frame, self.frame_num)
+        if self.camera_movement_estimator is None:
+            self.camera_movement_estimator = CameraMovementEstimator(frame, profiler=self.profiler, **self.camera_kwargs)
+
+        frame_tracks = {"players": [], "referees": [], "ball": []}
+        self.tracker.update_tracks(frame_tracks, self.tracker.detect_batch([context])[0])
+        players = frame_tracks["players"][0]
+        camera_movement = self.camera_movement_estimator.update(context)
+        assign_player_teams(self.team_assigner, context, players)
+
+        self.pending.append({
+            "frame_num": self.frame_num,
+            "frame": frame,
+            "players": players,
+            "referees": frame_tracks["referees"][0],
+            "camera_movement": camera_movement,
+            "arrival_time": arrival_time,
+        })
+        self.frame_num += 1
+        ball = frame_tracks["ball"][0].get(1)
+        return self._emit(self.ball_interpolator.push(None if ball is None else ball["box"]))
+
+    def flush(self):
+        # Emits the frames still waiting for the ball window at the end of the stream
+        return self._emit(self.ball_interpolator.flush())
+
+    def _emit(self, ball_boxes):
+        return [self._finish(self.pending.popleft(), ball_box) for ball_box in ball_boxes]
+
+    def _finish(self, item, ball_box):
+        players = item["players"]
+        team_colors = self.team_assigner.team_colors
+        for player_id, player in players.items():
+            team = self.team_assigner.player_team_dict.get(player_id)
+            if team is not None:
+                player["team"] = team
+                player["team_color"] = tuple(team_colors[team].tolist())
+
+        ball_owner = -1
+        if ball_box is not None:
+            ball_owner = self.player_assigner.assign_ball_to_player(players, ball_box)
+        if ball_owner != -1:
+            players[ball_owner]["has_ball"] = True
+            # Like the offline assignment, the last team to have the ball keeps control until someone else gets it
+            self.team_in_control = players[ball_owner].get("team", self.team_in_control)
+        self.possession_stats.update(self.team_in_control)
+        possession = self.possession_stats.percentages(self.possession_stats.num_frames - 1)
+
+        ball = {} if ball_box is None else {1: {"box": ball_box}}
+        frame = draw_frame_overlays(item["frame"], players, item["referees"], ball, possession, item["camera_movement"])
+
+        latency_ms = (time.perf_counter() - item["arrival_time"]) * 1000
+        self.latency.record(latency_ms)
+        return frame, {
+            "frame_num": item["frame_num"],
+            "latency_ms": latency_ms,
+            "ball_owner": int(ball_owner),
+            "team_in_control": int(self.team_in_control),
+            "possession": (float(possession[0]), float(possession[1])),
+        }
+
+
+def run_live_pipeline(source, output_path, tracker, latency_budget_ms=200.0, realtime=True, ball_max_gap=5,
+                      writer_options=None, on_frame=None, profiler=None):
+    # Consumes a live-like source and writes annotated frames as they become final. on_frame, when given,
+    # is called with each frame's stats. Returns the latency report including frames dropped by the source.
+    frame_source = LiveFrameSource(source, realtime=realtime)
+    live_pipeline = LivePipeline(tracker, latency_budget_ms, ball_max_gap, profiler=profiler)
+    writer = None
+    if output_path:
+        writer = BackgroundVideoWriter(output_path, get_video_properties(source)["fps"], profiler=profiler,
+                                       **(writer_options or {}))
+
+    def emit(results):
+        for frame, frame_stats in results:
+            if writer is not None:
+                writer.write(frame)
+            if on_frame is not None:
+                on_frame(frame_stats)
+
+    try:
+        for frame, arrival_time in frame_source:
+            emit(live_pipeline.process(frame, arrival_time))
+        emit(live_pipeline.flush())
+    finally:
+        if writer is not None:
+            writer.close()
+
+    report = live_pipeline.latency.summary()
+    report["dropped_frames"] = frame_source.dropped_frames
+    return report
@@ -0,0 +1,202 @@
+import math
+import os
+import sys
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+sys.path.append("../")
+import numpy as np
+from utils import iter_video, get_video_properties, box_iou_matrix, worker_state, init_worker_state
+from team_assigner import TeamAssigner
+from camera_movement_estimator import CameraMovementEstimator, RefreshRecorder
+from trackers import Tracker, TrackTable
+from trackers.track_table import OBJECT_CLASSES
+from profiler import NULL_PROFILER
+from .video_pipeline import analyze_frames, build_track_table, render_video
+
+def _analyze_segment(video_path, start, stop, camera_kwargs):
+    # Each worker process loads the detector once and reuses it for every segment it is given
+    tracker = worker_state["tracker"]
+    tracker.reset_tracking()
+    first_frame = next(iter_video(video_path, start, start + 1), None)
+    if first_frame is None:
+        return None
+    team_assigner = TeamAssigner()
+    camera_movement_estimator = RefreshRecorder(CameraMovementEstimator(first_frame, **camera_kwargs), start)
+    tracks, camera_movement_per_frame, _ = analyze_frames(
+        iter_video(video_path, start, stop), tracker, camera_movement_estimator, team_assigner
+    )
+    return {
+        "tracks": TrackTable.from_tracks(tracks).to_arrays(),
+        "camera_movement": camera_movement_per_frame,
+        "camera_refreshes": camera_movement_estimator.refresh_frames,
+        "team_colors": team_assigner.team_colors,
+        "votes": {player_id: list(votes) for player_id, votes in team_assigner.player_votes.items()},
+    }
+
+
+def plan_segments(num_frames, workers, segment_length=None, overlap=30):
+    # (processed_start, owned_start, stop) per segment; every segment after the first also processes the
+    # `overlap` frames before the ones it owns, which is where its tracks are matched to the previous segment
+    segment_length = segment_length or max(math.ceil(num_frames / workers), 4 * overlap, 1)
+    segments = []
+    for owned_start in range(0, num_frames, segment_length):
+        stop = min(owned_start + segment_length, num_frames)
+        segments.append((max(owned_start - overlap, 0), owned_start, stop))
+    return segments
+
+
+def match_overlap_ids(previous, previous_start, previous_ids, current, current_start, frames, iou_threshold=0.5):
+    # Votes (current local id -> previous global id) over the overlap frames and keeps the strongest
+    # one-to-one pairs
+    votes = Counter()
+    for frame_num in frames:
+        for object_name in ("players", "referees"):
+            previous_rows = previous.rows(object_name, frame_num - previous_start)
+            current_rows = current.rows(object_name, frame_num - current_start)
+            iou = box_iou_matrix(previous["box"][previous_rows], current["box"][current_rows])
+            if iou.size == 0:
+                continue
+            pairs = np.argwhere(iou >= iou_threshold)
+            previous_track_ids = previous["track_id"][previous_rows]
+            current_track_ids = current["track_id"][current_rows]
+            for previous_idx, current_idx in pairs:
+                global_id = previous_ids.get(int(previous_track_ids[previous_idx]))
+                if global_id is not None:
+                    votes[(int(current_track_ids[current_idx]), global_id)] += 1
+
+    mapping, used = {}, set()
+    for (local_id, global_id), _ in votes.most_common():
+        if local_id not in mapping and global_id not in used:
+            mapping[local_id] = global_id
+            used.add(global_id)
+    return mapping
+
+
+def _teams_swapped(team_colors, reference_colors):
+    if not team_colors or not reference_colors:
+        return False
+    same = np.linalg.norm(team_colors[1] - reference_colors[1]) + np.linalg.norm(team_colors[2] - reference_colors[2])
+    swapped = np.linalg.norm(team_colors[1] - reference_colors[2]) + np.linalg.norm(team_colors[2] - reference_colors[1])
+    return swapped < same
+
+
+def reconcile_camera_movement(video_path, segments, results, camera_kwargs=None):
+    # Every segment estimates camera movement from a cold start. The start of each owned range is rerun
+    # from the state the previous segment ended in, so the stitched movement matches the serial estimate.
+    # Updates the results in place.
+    if not results:
+        return results
+    first_frame = next(iter_video(video_path, stop=1))
+    estimator = CameraMovementEstimator(first_frame, **(camera_kwargs or {}))
+    last_refresh = None
+    for (processed_start, owned_start, _), result in zip(segments, results):
+        skip = owned_start - processed_start
+        camera_movement = result["camera_movement"][skip:]
+        refresh_frames = [frame for frame in result["camera_refreshes"] if frame >= owned_start]
+        if last_refresh is None:
+            # The first segment starts fresh, exactly like the serial estimate
+            last_refresh = refresh_frames[-1] if refresh_frames else owned_start
+        else:
+            last_refresh = estimator.resync_chunk(video_path, last_refresh, owned_start,
+                                                  owned_start + len(camera_movement), camera_movement, refresh_frames)
+        result["camera_movement"] = result["camera_movement"][:skip] + camera_movement
+    return results
+
+
+def stitch_segments(segments, results):
+    # Renumbers every segment's track ids into one global id space, keeps only the frames each segment
+    # owns and aligns team labels and team votes to the first segment's team colors
+    ball = OBJECT_CLASSES.index("ball")
+    columns, camera_movement_per_frame = [], []
+    team_votes = {}
+    reference_colors = None
+    next_id = 1
+    previous = None
+
+    for (processed_start, owned_start, stop), result in zip(segments, results):
+        table = TrackTable.from_arrays(result["tracks"])
+        local_ids = np.unique(table["track_id"][table["cls"] != ball])
+
+        mapping = {}
+        if previous is not None:
+            previous_table, previous_start, previous_ids = previous
+            mapping = match_overlap_ids(previous_table, previous_start, previous_ids, table, processed_start,
+                                        range(processed_start, owned_start))
+        for local_id in local_ids.tolist():
+            if local_id not in mapping:
+                mapping[local_id] = next_id
+                next_id += 1
+
+        if reference_colors is None and result["team_colors"]:
+            reference_colors = result["team_colors"]
+        swap = _teams_swapped(result["team_colors"], reference_colors)
+        for local_id, votes in result["votes"].items():
+            counter = team_votes.setdefault(mapping[local_id], Counter())
+            counter.update(3 - team if swap else team for team in votes)
+
+        owned = table.slice_frames(owned_start - processed_start)
+        owned_columns = dict(owned.columns)
+        track_ids = owned_columns["track_id"]
+        is_ball = owned_columns["cls"] == ball
+        if len(local_ids):
+            lookup = np.array([mapping[local_id] for local_id in local_ids.tolist()], dtype=np.int64)
+            idx = np.searchsorted(local_ids, track_ids[~is_ball])
+            track_ids = track_ids.copy()
+            track_ids[~is_ball] = lookup[idx]
+        owned_columns["track_id"] = track_ids
+        owned_columns["frame"] = owned_columns["frame"] + owned_start
+        columns.append(owned_columns)
+        camera_movement_per_frame += result["camera_movement"][owned_start - processed_start:]
+
+        previous = (table, processed_start, mapping)
+
+    merged = {name: np.concatenate([segment[name] for segment in columns]) for name in columns[0]}
+    order = np.lexsort((merged["track_id"], merged["cls"], merged["frame"]))
+    merged = {name: column[order] for name, column in merged.items()}
+    table = TrackTable(merged, len(camera_movement_per_frame), owned.fields)
+
+    team_assigner = TeamAssigner()
+    team_assigner.team_colors = reference_colors or {}
+    team_assigner.player_team_dict = {player_id: counter.most_common(1)[0][0] for player_id, counter in team_votes.items()}
+    return table, camera_movement_per_frame, team_assigner
+
+
+def process_video_segments(video_path, model_path, workers=None, segment_length=None, overlap=30,
+                           tracker_kwargs=None, camera_kwargs=None):
+    # Detection, tracking, camera movement and team votes for overlapping time segments in a process pool.
+    # Returns None when no frame could be read.
+    workers = workers or os.cpu_count() or 1
+    num_frames = get_video_properties(video_path)["frame_count"]
+    segments = plan_segments(num_frames, workers, segment_length, overlap) or [(0, 0, None)]
+    # The frame count is only container metadata: the last segment decodes up to the actual end of the
+    # video, and segments planned past it come back empty
+    segments[-1] = segments[-1][:2] + (None,)
+    builders = {"tracker": (Tracker, (model_path,), tracker_kwargs or {})}
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker_state, initargs=(builders,)) as executor:
+        futures = [executor.submit(_analyze_segment, video_path, processed_start, stop, camera_kwargs or {})
+                   for processed_start, _, stop in segments]
+        results = [future.result() for future in futures]
+    segments = [segment for segment, result in zip(segments, results) if result is not None]
+    results = [result for result in results if result is not None]
+    if not results:
+        return None
+    reconcile_camera_movement(video_path, segments, results, camera_kwargs)
+    return stitch_segments(segments, results)
+
+
+def run_segment_parallel_pipeline(video_path, output_path, model_path, workers=None, segment_length=None,
+                                  overlap=30, tracker_kwargs=None, camera_kwargs=None, writer_options=None,
+                                  profiler=None, view_transformer=None, speed_estimator=None):
+    # Only the main process stages are profiled, the segment workers are timed as a whole
+    profiler = profiler or NULL_PROFILER
+    with profiler.stage("segments"):
+        segmented = process_video_segments(video_path, model_path, workers, segment_length, overlap,
+                                           tracker_kwargs, camera_kwargs)
+    if segmented is None:
+        print(f"Failed to load video from {video_path}")
+        return None
+    table, camera_movement_per_frame, team_assigner = segmented
+    tracks = build_track_table(table.to_tracks(), camera_movement_per_frame, team_assigner, profiler,
+                               view_transformer, speed_estimator)
+    render_video(video_path, output_path, tracks, camera_movement_per_frame, writer_options, profiler)
+    return tracks
@@ -0,0 +1,195 @@
+from collections import deque
+import sys
+sys.path.append("../")
+import numpy as np
+from utils import iter_video, get_video_properties, save_video, read_stub, save_stub, FrameContext, frame_context
+from team_assigner import TeamAssigner
+from player_ball_assigner import PlayerBallAssigner, PossessionStats
+from camera_movement_estimator import CameraMovementEstimator
+from trackers import Tracker, TrackTable
+from annotation_renderer import AnnotationRenderer
+from profiler import NULL_PROFILER
+
+
+def assign_player_teams(team_assigner, frame, player_track):
+    # Teams are voted per track id in team_assigner.player_team_dict and written to the
+    # TrackTable in one go with TrackTable.set_teams
+    frame = frame_context(frame)
+    if not team_assigner.team_colors:
+        if not player_track:
+            return
+        team_assigner.assign_team_color(frame, player_track)
+
+    team_assigner.update_player_teams(frame, player_track)
+
+
+def assign_ball_possession(tracks, player_assigner, min_frames=1, profiler=None):
+    with (profiler or NULL_PROFILER).stage("ball_assignment", tracks.num_frames):
+        return _assign_ball_possession(tracks, player_assigner, min_frames)
+
+
+def _assign_ball_possession(tracks, player_assigner, min_frames):
+    players = tracks.class_mask("players")
+    ball = tracks.class_mask("ball")
+
+    ball_centers = np.full((tracks.num_frames, 2), np.nan, dtype=np.float32)
+    ball_boxes = tracks["box"][ball]
+    ball_centers[tracks["frame"][ball]] = np.trunc(
+        np.stack([ball_boxes[:, 0] + ball_boxes[:, 2], ball_boxes[:, 1] + ball_boxes[:, 3]], axis=1) / 2
+    )
+
+    assigned_players, team_ball_control = player_assigner.assign_ball_to_players(
+        tracks["frame"][players],
+        tracks["track_id"][players],
+        tracks["box"][players],
+        ball_centers,
+        player_teams=tracks["team"][players],
+        min_frames=min_frames,
+    )
+    tracks.set_has_ball(assigned_players)
+    return team_ball_control
+
+
+def build_track_table(tracks, camera_movement_per_frame, team_assigner, profiler=None,
+                      view_transformer=None, speed_estimator=None):
+    profiler = profiler or NULL_PROFILER
+    num_frames = len(tracks["ball"])
+    with profiler.stage("ball_interpolation", num_frames):
+        tracks["ball"] = Tracker.interpolate_ball_positions(tracks["ball"])
+    with profiler.stage("track_table", num_frames):
+        table = TrackTable.from_tracks(tracks)
+        table.add_positions()
+        table.add_adjusted_positions(camera_movement_per_frame)
+        table.set_teams(team_assigner.player_team_dict, team_assigner.team_colors)
+    add_pitch_metrics(table, view_transformer, speed_estimator, profiler)
+    return table
+
+
+def add_pitch_metrics(table, view_transformer=None, speed_estimator=None, profiler=None):
+    # Pitch coordinates for every row in one homography call, then per-track speed and distance
+    if view_transformer is None:
+        return table
+    profiler = profiler or NULL_PROFILER
+    with profiler.stage("view_transform", table.num_frames):
+        view_transformer.add_transformed_positions(table)
+    if speed_estimator is not None:
+        with profiler.stage("speed_and_distance", table.num_frames):
+            speed_estimator.add_speed_and_distance(table)
+    return table
+
+
+def detect_frame_contexts(tracker, contexts):
+    # Runs the frames through the tracker's prefetching detect loop, which re-reads the adaptive batch
+    # size for every batch, and yields (context, detections) pairs. Frames pulled by the loop wait in a
+    # queue for their detections, so at most the current and the prefetched batch are held.
+    pulled = deque()
+
+    def pull():
+        for context in contexts:
+            pulled.append(context)
+            yield context
+
+    for detections in tracker.detect_frames(pull()):
+        yield pulled.popleft(), detections
+
+
+def analyze_frames(frames, tracker, camera_movement_estimator, team_assigner,
+                   tracks=None, camera_movement_per_frame=None, detections=None, keep_detections=False):
+    # First pass over lazily decoded frames: detection and tracking (unless tracks are given),
+    # camera movement (unless given) and team votes. detections may replay cached detections.
+    # Returns the tracks, the camera movement and, with keep_detections, the newly detected frames'
+    # detections; they are only kept when the caller saves them, so streaming memory stays bounded.
+    detect = tracks is None
+    estimate_camera_movement = camera_movement_per_frame is None
+    tracks = {"players": [], "referees": [], "ball": []} if detect else tracks
+    camera_movement_per_frame = [] if estimate_camera_movement else camera_movement_per_frame
+    frame_detections = []
+    # Frames travel through the stages as FrameContexts, so derived data (grayscale, letterboxed
+    # detector input, jersey colors) is computed once per frame and shared
+    contexts = (FrameContext(frame, frame_num) for frame_num, frame in enumerate(frames))
+    if not detect:
+        contexts = ((context, None) for context in contexts)
+    elif detections is not None:
+        contexts = zip(contexts, detections)
+    else:
+        contexts = detect_frame_contexts(tracker, contexts)
+
+    for frame_num, (frame, detection) in enumerate(contexts):
+        if detect:
+            if keep_detections and detections is None:
+                frame_detections.append(detection)
+            tracker.update_tracks(tracks, detection)
+        if estimate_camera_movement:
+            camera_movement_per_frame.append(camera_movement_estimator.update(frame))
+
+        assign_player_teams(team_assigner, frame, tracks["players"][frame_num])
+
+    return tracks, camera_movement_per_frame, frame_detections
+
+
+def render_video(video_path, output_path, tracks, camera_movement_per_frame, writer_options=None, profiler=None):
+    # Possession, then a lazy render pass over the video straight into the background writer
+    profiler = profiler or NULL_PROFILER
+    possession_stats = PossessionStats(assign_ball_possession(tracks, PlayerBallAssigner(), profiler=profiler))
+    renderer = AnnotationRenderer(tracks, possession_stats, camera_movement_per_frame, profiler=profiler)
+    annotated_frames = renderer.render(profiler.iterate("decode", iter_video(video_path)))
+    save_video(annotated_frames, output_path, fps=get_video_properties(video_path)["fps"], profiler=profiler,
+               **(writer_options or {}))
+    return possession_stats
+
+
+def run_streaming_pipeline(video_path, output_path, tracker, read_from_stub=False,
+                           track_stub_path=None, camera_stub_path=None, cache=None, writer_options=None,
+                           profiler=None, view_transformer=None, speed_estimator=None):
+    # Two lazy passes over the video: the first detects, tracks and estimates camera movement,
+    # the second draws and writes. Only one detection batch of frames is ever held in memory.
+    result = process_video(video_path, output_path, tracker, read_from_stub, track_stub_path, camera_stub_path,
+                           cache, writer_options, profiler, view_transformer, speed_estimator)
+    return None if result is None else result[0]
+
+
+def process_video(video_path, output_path, tracker, read_from_stub=False, track_stub_path=None,
+                  camera_stub_path=None, cache=None, writer_options=None, profiler=None,
+                  view_transformer=None, speed_estimator=None):
+    # run_streaming_pipeline returning (tracks, possession_stats), or None when the video cannot be read
+    first_frame = next(iter_video(video_path, stop=1), None)
+    if first_frame is None:
+        print(f"Failed to load video from {video_path}")
+        return None
+    profiler = profiler or NULL_PROFILER
+    camera_movement_estimator = CameraMovementEstimator(first_frame, profiler=profiler)
+
+    stub_tracks = read_stub(read_from_stub, track_stub_path)
+    stub_camera_movement = read_stub(read_from_stub, camera_stub_path)
+    if cache is not None:
+        if stub_tracks is None:
+            stub_tracks = tracker.load_cached_tracks(cache, video_path)
+        if stub_camera_movement is None:
+            stub_camera_movement = camera_movement_estimator.load_cached_camera_movement(cache, video_path)
+
+    cached_detections = None
+    if stub_tracks is None and cache is not None:
+        cached_detections = tracker.load_cached_detections(cache, video_path)
+
+    team_assigner = TeamAssigner(profiler=profiler)
+    tracks, camera_movement_per_frame, frame_detections = analyze_frames(
+        profiler.iterate("decode", iter_video(video_path)), tracker, camera_movement_estimator, team_assigner,
+        tracks=stub_tracks, camera_movement_per_frame=stub_camera_movement, detections=cached_detections,
+        keep_detections=cache is not None,
+    )
+
+    if stub_tracks is None:
+        save_stub(track_stub_path, tracks)
+        if cache is not None:
+            tracker.save_cached_tracks(cache, video_path, tracks,
+                                       frame_detections if cached_detections is None else None)
+    if stub_camera_movement is None:
+        save_stub(camera_stub_path, camera_movement_per_frame)
+        if cache is not None:
+            camera_movement_estimator.save_cached_camera_movement(cache, video_path, camera_movement_per_frame)
+
+    tracks = build_track_table(tracks, camera_movement_per_frame, team_assigner, profiler,
+                               view_transformer, speed_estimator)
+    possession_stats = render_video(video_path, output_path, tracks, camera_movement_per_frame, writer_options, profiler)
+
+    return tracks, possession_stats
@@ -1 +1,2 @@
-from .player_ball_assigner import *
\ No newline at end of file
+from .player_ball_assigner import *
+from .possession_stats import PossessionStats
@@ -32,3 +32,60 @@ class PlayerBallAssigner():
         
         
         return assigned_player
+
+    def nearest_player_rows(self, player_frames, player_boxes, ball_centers):
+        # For every frame, the row of the closest player foot corner within max_player_ball_distance, or -1
+        player_frames = np.asarray(player_frames, dtype=np.int64)
+        player_boxes = np.asarray(player_boxes, dtype=np.float32).reshape(-1, 4)
+        ball_centers = np.asarray(ball_centers, dtype=np.float32).reshape(-1, 2)
+        num_frames = len(ball_centers)
+
+        ball = ball_centers[player_frames]
+        feet_y = player_boxes[:, 3] - ball[:, 1]
+        distance_left = np.hypot(player_boxes[:, 0] - ball[:, 0], feet_y)
+        distance_right = np.hypot(player_boxes[:, 2] - ball[:, 0], feet_y)
+        distances = np.fmin(distance_left, distance_right)
+
+        in_reach = np.flatnonzero(distances < self.max_player_ball_distance)
+        nearest_rows = np.full(num_frames, -1, dtype=np.int64)
+        if len(in_reach) == 0:
+            return nearest_rows
+        # Sorting by (frame, distance) puts each frame's closest player first
+        order = in_reach[np.lexsort((distances[in_reach], player_frames[in_reach]))]
+        frames, first = np.unique(player_frames[order], return_index=True)
+        nearest_rows[frames] = order[first]
+        return nearest_rows
+
+    def smooth_assignment(self, assigned_players, min_frames):
+        # Hysteresis: a player must be nearest for min_frames consecutive frames to count as having the ball
+        assigned_players = np.asarray(assigned_players)
+        if min_frames <= 1 or len(assigned_players) == 0:
+            return np.ones(len(assigned_players), dtype=bool)
+        run_starts = np.flatnonzero(np.r_[True, assigned_players[1:] != assigned_players[:-1]])
+        run_lengths = np.diff(np.r_[run_starts, len(assigned_players)])
+        return np.repeat(run_lengths >= min_frames, run_lengths)
+
+    def assign_ball_to_players(self, player_frames, player_ids, player_boxes, ball_centers,
+                               player_teams=None, min_frames=1):
+        # Whole-match assignment in one call. ball_centers is (num_frames, 2) with NaN where the ball
+        # is missing. Returns the assigned player id per frame (-1 for nobody) and the team in control
+        # per frame, carrying the last team forward when nobody is assigned (0 before anyone had the ball).
+        player_ids = np.asarray(player_ids, dtype=np.int64)
+        num_frames = len(np.asarray(ball_centers).reshape(-1, 2))
+        if len(player_ids) == 0:
+            return np.full(num_frames, -1, dtype=np.int64), np.zeros(num_frames, dtype=np.int8)
+        rows = self.nearest_player_rows(player_frames, player_boxes, ball_centers)
+        assigned_players = np.where(rows >= 0, player_ids[rows], -1)
+
+        keep = self.smooth_assignment(assigned_players, min_frames)
+        rows = np.where(keep, rows, -1)
+        assigned_players = np.where(keep, assigned_players, -1)
+
+        team_ball_control = np.zeros(len(rows), dtype=np.int8)
+        if player_teams is not None:
+            player_teams = np.asarray(player_teams, dtype=np.int8)
+            has_team = rows >= 0
+            last_assigned = np.maximum.accumulate(np.where(has_team, np.arange(len(rows)), -1))
+            known = last_assigned >= 0
+            team_ball_control[known] = player_teams[rows[last_assigned[known]]]
+        return assigned_players, team_ball_control
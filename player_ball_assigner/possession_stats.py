@@ -0,0 +1,79 @@
+import numpy as np
+
+
+class PossessionStats:
+    # Running possession counts per team. Built from a whole team_ball_control array it precomputes
+    # prefix sums once; in live use update() appends a frame in amortized O(1). Team 0 means nobody
+    # has had the ball yet.
+    def __init__(self, team_ball_control=(), teams=(1, 2)):
+        self.teams = tuple(teams)
+        control = np.array([0 if team is None else team for team in team_ball_control], dtype=np.int8)
+        self._control = control
+        self._cumulative = np.zeros((len(control) + 1, len(self.teams)), dtype=np.int64)
+        for team_idx, team in enumerate(self.teams):
+            self._cumulative[1:, team_idx] = np.cumsum(control == team)
+        self.num_frames = len(control)
+
+    def update(self, team):
+        if self.num_frames + 1 >= len(self._cumulative):
+            capacity = max(2 * len(self._cumulative), 16)
+            self._cumulative = np.resize(self._cumulative, (capacity, len(self.teams)))
+            self._control = np.resize(self._control, capacity)
+        team = 0 if team is None else team
+        self._control[self.num_frames] = team
+        self._cumulative[self.num_frames + 1] = self._cumulative[self.num_frames]
+        if team in self.teams:
+            self._cumulative[self.num_frames + 1, self.teams.index(team)] += 1
+        self.num_frames += 1
+
+    @property
+    def team_ball_control(self):
+        return self._control[:self.num_frames]
+
+    @property
+    def cumulative_counts(self):
+        return self._cumulative[1:self.num_frames + 1]
+
+    @staticmethod
+    def _to_percentages(counts):
+        totals = counts.sum(axis=-1, keepdims=True)
+        return np.divide(counts, totals, out=np.zeros(counts.shape, dtype=np.float64), where=totals > 0)
+
+    def percentages(self, frame_num=None):
+        # Share of possession per team up to and including frame_num, (0, 0) before anyone had the ball
+        if frame_num is None:
+            return self._to_percentages(self.cumulative_counts)
+        return self._to_percentages(self._cumulative[frame_num + 1])
+
+    def window_percentages(self, window):
+        # Share of possession over the last `window` frames, for every frame
+        ends = np.arange(1, self.num_frames + 1)
+        starts = np.maximum(ends - window, 0)
+        return self._to_percentages(self._cumulative[ends] - self._cumulative[starts])
+
+    def spells(self):
+        # Uninterrupted runs of one team in control: (start frames, stop frames, teams)
+        control = self.team_ball_control
+        if self.num_frames == 0:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty, np.zeros(0, dtype=np.int8)
+        starts = np.flatnonzero(np.r_[True, control[1:] != control[:-1]])
+        stops = np.r_[starts[1:], self.num_frames]
+        in_control = control[starts] != 0
+        return starts[in_control], stops[in_control], control[starts][in_control]
+
+    def turnovers(self):
+        # Frames at which control passes from one team to the other
+        starts, _, teams = self.spells()
+        return starts[1:][teams[1:] != teams[:-1]]
+
+    def as_arrays(self):
+        starts, stops, teams = self.spells()
+        return {
+            "team_ball_control": self.team_ball_control,
+            "percentages": self.percentages(),
+            "spell_start": starts,
+            "spell_stop": stops,
+            "spell_team": teams,
+            "turnovers": self.turnovers(),
+        }
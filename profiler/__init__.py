@@ -0,0 +1 @@
+from .stage_profiler import StageProfiler, NullProfiler, NULL_PROFILER, peak_rss_bytes
@@ -0,0 +1,167 @@
+import bisect
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import nullcontext
+
+# Upper edges of the per-frame latency histogram buckets, in milliseconds
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+
+def peak_rss_bytes():
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+        return peak if sys.platform == "darwin" else peak * 1024
+    except ImportError:
+        pass
+    try:
+        import psutil
+        memory_info = psutil.Process().memory_info()
+        return getattr(memory_info, "peak_wset", memory_info.rss)
+    except ImportError:
+        return None
+
+
+class _StageTimer:
+    __slots__ = ("profiler", "name", "frames", "wall_start", "cpu_start")
+
+    def __init__(self, profiler, name, frames):
+        self.profiler = profiler
+        self.name = name
+        self.frames = frames
+
+    def __enter__(self):
+        self.wall_start = time.perf_counter()
+        self.cpu_start = time.thread_time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.profiler.record(self.name, self.wall_start, time.perf_counter() - self.wall_start,
+                             time.thread_time() - self.cpu_start, self.frames)
+
+
+class StageProfiler:
+    # Collects per-stage wall and CPU time, frame counts and per-frame latencies from any thread.
+    # Stages are timed with `with profiler.stage("detect", frames=len(batch)):`. With trace=True every
+    # timed call is also kept as a Chrome trace event (chrome://tracing, Perfetto).
+    enabled = True
+
+    def __init__(self, trace=False):
+        self.trace = trace
+        self.stages = {}
+        self.events = []
+        self._lock = threading.Lock()
+        self._wall_origin = time.perf_counter()
+        self._cpu_origin = time.process_time()
+
+    def __reduce__(self):
+        # Profiles stay in the process that created them; pickled copies sent to workers record nothing
+        return NullProfiler, ()
+
+    def stage(self, name, frames=1):
+        return _StageTimer(self, name, frames)
+
+    def iterate(self, name, iterable):
+        # Times producing each item of a lazy iterable, e.g. decoding frames
+        iterator = iter(iterable)
+        while True:
+            wall_start, cpu_start = time.perf_counter(), time.thread_time()
+            item = next(iterator, StopIteration)
+            if item is StopIteration:
+                return
+            self.record(name, wall_start, time.perf_counter() - wall_start, time.thread_time() - cpu_start)
+            yield item
+
+    def record(self, name, start, wall, cpu, frames=1):
+        with self._lock:
+            stats = self.stages.get(name)
+            if stats is None:
+                stats = self.stages[name] = {"calls": 0, "frames": 0, "wall": 0.0, "cpu": 0.0, "latencies": []}
+            stats["calls"] += 1
+            stats["frames"] += frames
+            stats["wall"] += wall
+            stats["cpu"] += cpu
+            stats["latencies"].append(wall / max(frames, 1))
+            if self.trace:
+                self.events.append({
+                    "name": name, "ph": "X", "pid": os.getpid(), "tid": threading.get_ident(),
+                    "ts": (start - self._wall_origin) * 1e6, "dur": wall * 1e6, "args": {"frames": frames},
+                })
+
+    def stage_summary(self, stats):
+        latencies_ms = sorted(latency * 1000 for latency in stats["latencies"])
+        histogram, bucket_start = {}, 0
+        for upper in LATENCY_BUCKETS_MS:
+            bucket_stop = bisect.bisect_right(latencies_ms, upper)
+            histogram[f"<={upper}ms"] = bucket_stop - bucket_start
+            bucket_start = bucket_stop
+        histogram[f">{LATENCY_BUCKETS_MS[-1]}ms"] = len(latencies_ms) - bucket_start
+
+        def percentile(q):
+            return latencies_ms[min(int(q * len(latencies_ms)), len(latencies_ms) - 1)] if latencies_ms else 0.0
+
+        return {
+            "calls": stats["calls"],
+            "frames": stats["frames"],
+            "wall_seconds": stats["wall"],
+            "cpu_seconds": stats["cpu"],
+            "fps": stats["frames"] / stats["wall"] if stats["wall"] > 0 else None,
+            "latency_ms": {"mean": sum(latencies_ms) / len(latencies_ms) if latencies_ms else 0.0,
+                           "p50": percentile(0.5), "p90": percentile(0.9), "p99": percentile(0.99),
+                           "max": latencies_ms[-1] if latencies_ms else 0.0},
+            "latency_histogram": histogram,
+        }
+
+    def summary(self):
+        with self._lock:
+            stages = {name: self.stage_summary(stats) for name, stats in self.stages.items()}
+        return {
+            "wall_seconds": time.perf_counter() - self._wall_origin,
+            "cpu_seconds": time.process_time() - self._cpu_origin,
+            "peak_rss_bytes": peak_rss_bytes(),
+            "stages": stages,
+        }
+
+    def save_metrics(self, path):
+        with open(path, "w") as file:
+            json.dump(self.summary(), file, indent=2)
+
+    def save_chrome_trace(self, path):
+        with self._lock:
+            events = list(self.events)
+        with open(path, "w") as file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file)
+
+    def report(self):
+        summary = self.summary()
+        lines = [f"{'stage':<20}{'frames':>8}{'wall s':>10}{'cpu s':>10}{'fps':>10}{'p50 ms':>10}{'p99 ms':>10}"]
+        for name, stage in sorted(summary["stages"].items(), key=lambda item: -item[1]["wall_seconds"]):
+            fps = f"{stage['fps']:.1f}" if stage["fps"] else "-"
+            lines.append(f"{name:<20}{stage['frames']:>8}{stage['wall_seconds']:>10.2f}{stage['cpu_seconds']:>10.2f}"
+                         f"{fps:>10}{stage['latency_ms']['p50']:>10.2f}{stage['latency_ms']['p99']:>10.2f}")
+        peak = summary["peak_rss_bytes"]
+        lines.append(f"total {summary['wall_seconds']:.2f}s wall, {summary['cpu_seconds']:.2f}s cpu"
+                     + (f", peak RSS {peak / 1024 ** 2:.0f} MiB" if peak else ""))
+        return "\n".join(lines)
+
+
+class NullProfiler:
+    # Stand-in used when profiling is off: every hook is a no-op
+    enabled = False
+    _null_context = nullcontext()
+
+    def stage(self, name, frames=1):
+        return self._null_context
+
+    def iterate(self, name, iterable):
+        return iterable
+
+    def record(self, name, start, wall, cpu, frames=1):
+        pass
+
+
+NULL_PROFILER = NullProfiler()
@@ -0,0 +1,71 @@
+import numpy as np
+
+
+class SpeedAndDistanceEstimator:
+    # Per-track speed (km/h) and cumulative distance (m) from pitch coordinates, over all rows of a
+    # TrackTable at once. Positions are smoothed with a trailing mean over frame_window frames, speed is the
+    # smoothed displacement over the same window and distance the sum of smoothed steps. Steps across gaps
+    # longer than max_gap frames are not counted, and speeds above max_speed_kmh are dropped as outliers.
+    def __init__(self, fps=24.0, frame_window=5, max_gap=10, max_speed_kmh=45.0, objects=("players",)):
+        self.fps = fps
+        self.frame_window = frame_window
+        self.max_gap = max_gap
+        self.max_speed_kmh = max_speed_kmh
+        self.objects = objects
+
+    def add_speed_and_distance(self, tracks):
+        num_rows = len(tracks)
+        speed = np.full(num_rows, np.nan, dtype=np.float32)
+        distance = np.full(num_rows, np.nan, dtype=np.float32)
+
+        positions = tracks["position_transformed"]
+        mask = np.zeros(num_rows, dtype=bool)
+        for object_name in self.objects:
+            mask |= tracks.class_mask(object_name)
+        rows = np.flatnonzero(mask & np.isfinite(positions).all(axis=1))
+
+        if len(rows):
+            # Rows of each track together, in frame order
+            track_ids = tracks["track_id"][rows]
+            frames = tracks["frame"][rows].astype(np.int64)
+            order = np.lexsort((frames, track_ids, tracks["cls"][rows]))
+            rows, track_ids, frames = rows[order], track_ids[order], frames[order]
+            points = positions[rows].astype(np.float64)
+
+            starts = np.r_[True, (track_ids[1:] != track_ids[:-1]) | (tracks["cls"][rows][1:] != tracks["cls"][rows][:-1])]
+            groups = np.cumsum(starts) - 1
+            # Monotonic key, so windows become searchsorted lookups that never cross into another track
+            keys = groups * (tracks.num_frames + self.frame_window + self.max_gap + 1) + frames
+            index = np.arange(len(rows))
+
+            window_start = np.searchsorted(keys, keys - (self.frame_window - 1))
+            counts = (index + 1 - window_start)[:, None]
+            cumulative = np.vstack([np.zeros((1, 3)), np.cumsum(np.column_stack([points, frames]), axis=0)])
+            smoothed = (cumulative[index + 1] - cumulative[window_start]) / counts
+            # Each smoothed position belongs to the mean frame of its window, which lags less after a gap
+            smoothed, smoothed_frames = smoothed[:, :2], smoothed[:, 2]
+
+            step_frames = np.r_[0, np.diff(frames)]
+            steps = np.r_[0.0, np.linalg.norm(np.diff(smoothed, axis=0), axis=1)]
+            steps[starts | (step_frames > self.max_gap)] = 0.0
+            walked = np.cumsum(steps)
+            group_first = np.flatnonzero(starts)
+            distance[rows] = walked - walked[group_first[groups]]
+
+            # Speed from the last row at least frame_window frames earlier, so a short gap inside the window
+            # does not reset it; across a gap longer than max_gap (or early in a track) from the first row of
+            # the window instead. A row without any earlier one has no speed.
+            previous = np.searchsorted(keys, keys - self.frame_window, side="right") - 1
+            valid = np.maximum(previous, 0)
+            too_far = ((previous < 0) | (groups[valid] != groups)
+                       | (frames - frames[valid] > self.frame_window + self.max_gap))
+            previous = np.where(too_far, np.searchsorted(keys, keys - self.frame_window), previous)
+            elapsed = (smoothed_frames - smoothed_frames[previous]) / self.fps
+            moved = np.linalg.norm(smoothed - smoothed[previous], axis=1)
+            track_speed = np.divide(moved, elapsed, out=np.full(len(rows), np.nan), where=elapsed > 0) * 3.6
+            track_speed[track_speed > self.max_speed_kmh] = np.nan
+            speed[rows] = track_speed
+
+        tracks.columns["speed"] = speed
+        tracks.columns["distance"] = distance
+        tracks.fields.update(("speed", "distance"))
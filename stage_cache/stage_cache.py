@@ -0,0 +1,134 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+import sys
+import numpy as np
+sys.path.append("../")
+from utils import write_json_atomic
+
+CACHE_FORMAT_VERSION = 1
+
+
+def hash_file(path, chunk_size=1 << 20):
+    sha = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+class CacheEntry:
+    def __init__(self, path, meta, arrays):
+        self.path = path
+        self.meta = meta
+        self.arrays = arrays
+        self.start = meta["start"]
+        self.stop = meta["stop"]
+
+    def frame_slice(self, start=0, stop=None):
+        # Slice relative to the entry for a range given in absolute frame numbers
+        return slice(start - self.start, None if stop is None else stop - self.start)
+
+
+class StageCache:
+    # Content-addressed store for stage results. Each entry is a directory of .npy files that are
+    # memory-mapped on load, keyed by a hash of the video content, the model file and the stage
+    # parameters, and tagged with the frame range it covers.
+    def __init__(self, root, max_bytes=20 * 1024 ** 3):
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(root, exist_ok=True)
+        self._file_hashes_path = os.path.join(root, "file_hashes.json")
+        self._file_hashes = self._read_json(self._file_hashes_path, {})
+
+    @staticmethod
+    def _read_json(path, default):
+        try:
+            with open(path) as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return default
+
+    def file_hash(self, path):
+        # Hashing a whole match is slow, so content hashes are memoized per (path, size, mtime)
+        stat = os.stat(path)
+        memo_key = f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+        if memo_key not in self._file_hashes:
+            self._file_hashes = self._read_json(self._file_hashes_path, {})
+            self._file_hashes[memo_key] = hash_file(path)
+            write_json_atomic(self._file_hashes_path, self._file_hashes)
+        return self._file_hashes[memo_key]
+
+    def key(self, stage, **inputs):
+        payload = json.dumps({"stage": stage, "format": CACHE_FORMAT_VERSION, "inputs": inputs},
+                             sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _key_dir(self, stage, key):
+        return os.path.join(self.root, stage, key)
+
+    def _entries(self, stage, key):
+        key_dir = self._key_dir(stage, key)
+        if not os.path.isdir(key_dir):
+            return []
+        entries = []
+        for name in os.listdir(key_dir):
+            meta = self._read_json(os.path.join(key_dir, name, "meta.json"), None)
+            if meta is not None:
+                entries.append((os.path.join(key_dir, name), meta))
+        return entries
+
+    def load(self, stage, key, start=0, stop=None):
+        # Returns an entry covering [start, stop); stop=None asks for everything up to the end of the video
+        for path, meta in self._entries(stage, key):
+            if meta["start"] > start:
+                continue
+            if stop is None and not meta["complete"]:
+                continue
+            if stop is not None and meta["stop"] < stop:
+                continue
+            arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r") for name in meta["arrays"]}
+            os.utime(os.path.join(path, "meta.json"))
+            return CacheEntry(path, meta, arrays)
+        return None
+
+    def save(self, stage, key, arrays, start=0, stop=None, num_frames=None):
+        # stop=None marks the entry as running to the end of the video; num_frames then gives its length
+        complete = stop is None
+        if complete:
+            stop = start + num_frames if num_frames is not None else start
+        key_dir = self._key_dir(stage, key)
+        os.makedirs(key_dir, exist_ok=True)
+        tmp_dir = os.path.join(key_dir, f".tmp-{uuid.uuid4().hex}")
+        os.makedirs(tmp_dir)
+        for name, array in arrays.items():
+            np.save(os.path.join(tmp_dir, f"{name}.npy"), np.asarray(array), allow_pickle=False)
+        meta = {"stage": stage, "start": start, "stop": stop, "complete": complete,
+                "arrays": sorted(arrays), "created": time.time()}
+        write_json_atomic(os.path.join(tmp_dir, "meta.json"), meta)
+
+        entry_dir = os.path.join(key_dir, f"{start}-{stop}{'-end' if complete else ''}")
+        if os.path.exists(entry_dir):
+            shutil.rmtree(entry_dir, ignore_errors=True)
+        os.replace(tmp_dir, entry_dir)
+        self.evict()
+        return entry_dir
+
+    def evict(self):
+        # Drop least recently used entries until the cache fits in max_bytes
+        entries = []
+        total_size = 0
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            if "meta.json" not in filenames or os.path.basename(dirpath).startswith(".tmp-"):
+                continue
+            size = sum(os.path.getsize(os.path.join(dirpath, name)) for name in filenames)
+            entries.append((os.path.getmtime(os.path.join(dirpath, "meta.json")), size, dirpath))
+            total_size += size
+        for _, size, dirpath in sorted(entries):
+            if total_size <= self.max_bytes:
+                break
+            shutil.rmtree(dirpath, ignore_errors=True)
+            total_size -= size
@@ -1,52 +1,167 @@
-from sklearn.cluster import KMeans
+from collections import deque
+import sys
+import numpy as np
+sys.path.append("../")
+from profiler import NULL_PROFILER
+from utils import as_frame, frame_context
+
+# Every player crop is sampled on the same grid so a whole frame's crops cluster as one array
+CROP_GRID = (16, 16)
+
+
+def two_means(points, init_centers, iterations=10):
+    # Fixed-iteration 2-means over a batch: points is (B, N, 3), init_centers (B, 2, 3)
+    centers = init_centers.astype(np.float32)
+    for _ in range(iterations):
+        distances = ((points[:, :, None, :] - centers[:, None, :, :]) ** 2).sum(axis=-1)
+        labels = distances.argmin(axis=-1)
+        one_hot = np.stack([labels == 0, labels == 1], axis=-1).astype(np.float32)
+        counts = one_hot.sum(axis=1)
+        sums = np.einsum("bnk,bnc->bkc", one_hot, points)
+        # Keep the previous center for a cluster that lost all its points
+        centers = np.where(counts[..., None] > 0, sums / np.maximum(counts[..., None], 1), centers)
+    distances = ((points[:, :, None, :] - centers[:, None, :, :]) ** 2).sum(axis=-1)
+    return distances.argmin(axis=-1), centers
+
+
+def farthest_pair_init(points):
+    # Deterministic seeds: the point farthest from the mean, then the point farthest from that one
+    mean = points.mean(axis=1, keepdims=True)
+    first = points[np.arange(len(points)), ((points - mean) ** 2).sum(axis=-1).argmax(axis=1)]
+    second = points[np.arange(len(points)), ((points - first[:, None]) ** 2).sum(axis=-1).argmax(axis=1)]
+    return np.stack([first, second], axis=1)
+
+
+def kmeans_plus_plus_init(points, n_init, rng):
+    # n_init k-means++ seedings of one point set (N, 3): a random first center, then a second drawn with
+    # probability proportional to the squared distance from it. Returns (n_init, 2, 3)
+    first = rng.integers(0, len(points), size=n_init)
+    distances = ((points[None] - points[first][:, None]) ** 2).sum(axis=-1)
+    totals = distances.sum(axis=1, keepdims=True)
+    probabilities = np.where(totals > 0, distances / np.maximum(totals, 1e-12), 1.0 / len(points))
+    cumulative = np.cumsum(probabilities, axis=1)
+    second = (cumulative < rng.random((n_init, 1)) * cumulative[:, -1:]).sum(axis=1)
+    return np.stack([points[first], points[np.minimum(second, len(points) - 1)]], axis=1)
+
+
+def fit_two_means(points, n_init=10, iterations=20, seed=0):
+    # Several seedings run as one batch and the fit with the lowest inertia is kept, so an outlier crop
+    # (referee, goalkeeper, occlusion) picked as a seed does not decide the result
+    points = np.asarray(points, dtype=np.float32).reshape(-1, 3)
+    seeds = np.concatenate([farthest_pair_init(points[None]),
+                            kmeans_plus_plus_init(points, n_init, np.random.default_rng(seed))])
+    labels, centers = two_means(np.broadcast_to(points, (len(seeds),) + points.shape), seeds, iterations)
+    inertia = ((points[None] - np.take_along_axis(centers, labels[..., None], axis=1)) ** 2).sum(axis=(1, 2))
+    best = int(inertia.argmin())
+    return labels[best], centers[best]
+
 
 class TeamAssigner:
-    def __init__(self):
+    def __init__(self, vote_window=15, vote_interval=5, n_init=10, seed=0, profiler=None):
         self.team_colors = dict()
         self.player_team_dict = dict()
-    
-    def get_clustering_model(self, image):
-        image_2d = image.reshape(-1, 3)
-        kmeans = KMeans(n_clusters=2, init="k-means++", n_init=1).fit(image_2d)
-        return kmeans
-        
-    
-    def get_player_color(self, frame, box):
-        box = list(map(int, box))
-        image = frame[box[1]: box[3], box[0]: box[2]]
-        top_half_image = image[0 : int(image.shape[0]/2), :]
-        kmeans = self.get_clustering_model(top_half_image)
-        labels = kmeans.labels_
-        clustered_image = labels.reshape(top_half_image.shape[0], top_half_image.shape[1])
-        corners_cluster = [clustered_image[0, 0], clustered_image[0, -1], clustered_image[-1, 0], clustered_image[-1, -1]]
-        non_player_cluster = max(set(corners_cluster), key=corners_cluster.count)
+        # Each track keeps its last vote_window team votes, one every vote_interval frames it is seen
+        self.vote_window = vote_window
+        self.vote_interval = vote_interval
+        self.player_votes = dict()
+        self.player_last_vote = dict()
+        self.frame_counter = 0
+        self.n_init = n_init
+        self.seed = seed
+        self.profiler = profiler or NULL_PROFILER
+
+    def sample_top_halves(self, frame, boxes):
+        # Samples the top half of every box on a fixed grid in a single gather: (B, grid_h * grid_w, 3)
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        grid_h, grid_w = CROP_GRID
+        steps_y = (np.arange(grid_h, dtype=np.float32) + 0.5) / grid_h
+        steps_x = (np.arange(grid_w, dtype=np.float32) + 0.5) / grid_w
+        half_heights = (boxes[:, 3] - boxes[:, 1]) / 2
+        ys = boxes[:, 1, None] + half_heights[:, None] * steps_y
+        xs = boxes[:, 0, None] + (boxes[:, 2] - boxes[:, 0])[:, None] * steps_x
+        ys = np.clip(ys.astype(np.int64), 0, frame.shape[0] - 1)
+        xs = np.clip(xs.astype(np.int64), 0, frame.shape[1] - 1)
+        pixels = frame[ys[:, :, None], xs[:, None, :]]
+        return pixels.reshape(len(boxes), grid_h * grid_w, 3).astype(np.float32)
+
+    def get_player_colors(self, frame, boxes):
+        pixels = self.sample_top_halves(frame, boxes)
+        if len(pixels) == 0:
+            return np.zeros((0, 3), dtype=np.float32)
+        grid_h, grid_w = CROP_GRID
+        corner_idx = [0, grid_w - 1, (grid_h - 1) * grid_w, grid_h * grid_w - 1]
+
+        # Seed the background cluster with the corners and the player cluster with the farthest pixel from them
+        background = pixels[:, corner_idx].mean(axis=1)
+        player = pixels[np.arange(len(pixels)), ((pixels - background[:, None]) ** 2).sum(axis=-1).argmax(axis=1)]
+        labels, centers = two_means(pixels, np.stack([background, player], axis=1))
+
+        # The cluster most corners fall into is the background, the other one is the jersey
+        non_player_cluster = (labels[:, corner_idx].sum(axis=1) > len(corner_idx) / 2).astype(np.int64)
         player_cluster = 1 - non_player_cluster
-        player_color = kmeans.cluster_centers_[player_cluster]
-        return player_color
+        return centers[np.arange(len(centers)), player_cluster]
+
+    def get_player_color(self, frame, box):
+        return self.get_player_colors(as_frame(frame), [box])[0]
+
+    def get_track_colors(self, frame, player_detections, player_ids):
+        # Jersey colors of the given tracks, memoized per track on the frame's FrameContext so a
+        # track is sampled at most once per frame however many steps ask for it
+        context = frame_context(frame)
+        missing = [player_id for player_id in player_ids if ("player_color", player_id) not in context]
+        if missing:
+            colors = self.get_player_colors(context.frame, [player_detections[player_id]["box"] for player_id in missing])
+            for player_id, color in zip(missing, colors):
+                context.put(("player_color", player_id), color)
+        return np.array([context.get(("player_color", player_id)) for player_id in player_ids],
+                        dtype=np.float32).reshape(-1, 3)
 
-    
     def assign_team_color(self, frame, player_detections):
-        player_colors = []
-        for _, player_detection in player_detections.items():
-            box = player_detection["box"]
-            player_color = self.get_player_color(frame, box)
-            player_colors.append(player_color)
-            
-        kmeans = KMeans(n_clusters=2, n_init=10).fit(player_colors)
-        self.kmeans = kmeans
-        self.team_colors[1] = kmeans.cluster_centers_[0]
-        self.team_colors[2] = kmeans.cluster_centers_[1]
-        
+        with self.profiler.stage("team_colors"):
+            self._assign_team_color(frame, player_detections)
+
+    def _assign_team_color(self, frame, player_detections):
+        player_colors = self.get_track_colors(frame, player_detections, list(player_detections))
+
+        _, centers = fit_two_means(player_colors, self.n_init, seed=self.seed)
+        self.team_colors[1] = centers[0].astype(np.float64)
+        self.team_colors[2] = centers[1].astype(np.float64)
+
+    def predict_teams(self, player_colors):
+        centers = np.stack([self.team_colors[1], self.team_colors[2]])
+        distances = ((player_colors[:, None, :] - centers[None]) ** 2).sum(axis=-1)
+        return distances.argmin(axis=1) + 1
+
+    def _vote(self, player_id, team_id):
+        votes = self.player_votes.setdefault(player_id, deque(maxlen=self.vote_window))
+        votes.append(int(team_id))
+        # Majority of the recent votes, ties going to the latest vote
+        counts = {team: votes.count(team) for team in votes}
+        best = max(counts.values())
+        self.player_team_dict[player_id] = next(team for team in reversed(votes) if counts[team] == best)
+
+    def update_player_teams(self, frame, player_detections):
+        with self.profiler.stage("team_assignment"):
+            return self._update_player_teams(frame, player_detections)
+
+    def _update_player_teams(self, frame, player_detections):
+        # Batched per-frame update: every track due for a vote is cropped and classified in one pass
+        self.frame_counter += 1
+        due_ids = [
+            player_id for player_id in player_detections
+            if self.frame_counter - self.player_last_vote.get(player_id, -self.vote_interval) >= self.vote_interval
+        ]
+        if due_ids:
+            teams = self.predict_teams(self.get_track_colors(frame, player_detections, due_ids))
+            for player_id, team_id in zip(due_ids, teams):
+                self.player_last_vote[player_id] = self.frame_counter
+                self._vote(player_id, team_id)
+        return {player_id: self.player_team_dict[player_id] for player_id in player_detections}
+
     def get_player_team(self, frame, player_box, player_id):
         if player_id in self.player_team_dict:
             return self.player_team_dict[player_id]
         player_color = self.get_player_color(frame, player_box)
-        # Ensure player_color is reshaped correctly
-        team_id = self.kmeans.predict(player_color.reshape(1, -1))[0]
-        team_id += 1
-        if player_id == 81:
-            team_id = 1
-        self.player_team_dict[player_id] = team_id
-        return team_id
-
-        
\ No newline at end of file
+        team_id = int(self.predict_teams(player_color.reshape(1, -1))[0])
+        self._vote(player_id, team_id)
+        return self.player_team_dict[player_id]
@@ -0,0 +1,21 @@
+from trackers import Tracker
+from trackers.detector_backends import ReplayBackend
+from utils import worker_state
+from profiler import NULL_PROFILER
+from batch_runner import run_job
+from benchmarks.synthetic import CLASS_NAMES, write_synthetic_video
+
+
+def test_profiled_job_times_detection_and_tracking(tmp_path):
+    video_path = str(tmp_path / "clip.avi")
+    detections = write_synthetic_video(video_path, num_frames=20, width=320, height=180)
+    worker_state["tracker"] = Tracker(None, backend=ReplayBackend(detections, CLASS_NAMES))
+    worker_state["cache"] = None
+    job = {"name": "clip", "video": video_path, "output": str(tmp_path / "clip_out.avi"),
+           "result": str(tmp_path / "clip.json")}
+
+    result = run_job(job, profile=True)
+    assert result["status"] == "done"
+    assert {"preprocess", "detect", "track", "camera_movement", "encode"} <= set(result["profile"]["stages"])
+    # The worker's tracker goes back to its own profiler for the next job
+    assert worker_state["tracker"].profiler is NULL_PROFILER
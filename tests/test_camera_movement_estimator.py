@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+from utils import read_video
+from camera_movement_estimator import CameraMovementEstimator
+from benchmarks.synthetic import write_synthetic_video
+
+
+@pytest.fixture(scope="module")
+def panning_video(tmp_path_factory):
+    video_path = str(tmp_path_factory.mktemp("camera") / "pan.avi")
+    write_synthetic_video(video_path, num_frames=60, width=1280, height=720)
+    return video_path
+
+
+@pytest.mark.parametrize("method", ["max", "median", "affine"])
+def test_parallel_camera_movement_matches_serial(panning_video, method):
+    frames = read_video(panning_video)
+    serial = CameraMovementEstimator(frames[0], method=method).get_camera_movement(frames)
+    parallel = CameraMovementEstimator(frames[0], method=method).get_camera_movement_parallel(
+        panning_video, workers=2, chunk_size=13
+    )
+    np.testing.assert_allclose(parallel, serial, atol=1e-4)
+
+
+def test_parallel_camera_movement_of_a_frame_range(panning_video):
+    frames = read_video(panning_video)
+    serial = CameraMovementEstimator(frames[0], method="median").get_camera_movement(frames[17:50])
+    parallel = CameraMovementEstimator(frames[0], method="median").get_camera_movement_parallel(
+        panning_video, workers=2, chunk_size=10, frame_range=(17, 50)
+    )
+    np.testing.assert_allclose(parallel, serial, atol=1e-4)
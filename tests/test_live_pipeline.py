@@ -0,0 +1,44 @@
+import numpy as np
+from trackers import Tracker
+from trackers.detector_backends import ReplayBackend
+from pipeline.live_pipeline import LivePipeline, run_live_pipeline
+from benchmarks.synthetic import CLASS_NAMES, SyntheticMatch, write_synthetic_video
+
+
+def without_ball(detections, frame_nums):
+    # Hides the ball on frame_nums, for gaps longer than the interpolation window
+    return [detection[detection.class_id != 0] if frame_num in frame_nums else detection
+            for frame_num, detection in enumerate(detections)]
+
+
+def test_pending_frames_stay_within_ball_window_and_flush_drains():
+    match = SyntheticMatch(80, width=320, height=180, players_per_team=4)
+    frames, detections = zip(*match.frames())
+    detections = without_ball(detections, range(30, 50))
+    live = LivePipeline(Tracker(None, backend=ReplayBackend(detections, CLASS_NAMES)), ball_max_gap=5)
+    # The model is loaded before the first frame arrives
+    assert live.tracker._backend is not None
+
+    emitted = []
+    for frame in frames:
+        emitted += live.process(frame)
+        assert len(live.pending) <= 5
+    emitted += live.flush()
+
+    assert len(live.pending) == 0
+    assert [frame_stats["frame_num"] for _, frame_stats in emitted] == list(range(len(frames)))
+    assert live.latency.summary()["frames"] == len(frames)
+
+
+def test_run_live_pipeline_without_realtime_keeps_every_frame(tmp_path):
+    video_path = str(tmp_path / "match.avi")
+    detections = write_synthetic_video(video_path, num_frames=40, width=320, height=180)
+    tracker = Tracker(None, backend=ReplayBackend(detections, CLASS_NAMES))
+
+    frame_nums = []
+    report = run_live_pipeline(video_path, None, tracker, realtime=False,
+                               on_frame=lambda frame_stats: frame_nums.append(frame_stats["frame_num"]))
+
+    assert frame_nums == list(range(40))
+    assert report["frames"] == 40 and report["dropped_frames"] == 0
+    assert np.isfinite(report["p95_ms"])
@@ -0,0 +1,32 @@
+import numpy as np
+from player_ball_assigner import PlayerBallAssigner
+
+
+def test_assign_ball_without_players():
+    ball_centers = np.array([[100, 100], [np.nan, np.nan], [120, 110]], dtype=np.float32)
+    assigned_players, team_ball_control = PlayerBallAssigner().assign_ball_to_players(
+        np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros((0, 4)), ball_centers,
+        player_teams=np.zeros(0, dtype=np.int8), min_frames=3,
+    )
+    assert assigned_players.tolist() == [-1, -1, -1]
+    assert team_ball_control.tolist() == [0, 0, 0]
+
+
+def test_assign_ball_matches_per_frame_assignment():
+    rng = np.random.default_rng(0)
+    assigner = PlayerBallAssigner()
+    num_frames, num_players = 200, 6
+    player_frames = np.repeat(np.arange(num_frames), num_players)
+    player_ids = np.tile(np.arange(1, num_players + 1), num_frames)
+    corners = rng.integers(0, 400, (len(player_frames), 2))
+    player_boxes = np.concatenate([corners, corners + [30, 80]], axis=1).astype(np.float32)
+    ball_centers = rng.integers(0, 480, (num_frames, 2)).astype(np.float32)
+    ball_centers[rng.random(num_frames) < 0.2] = np.nan
+
+    assigned_players, _ = assigner.assign_ball_to_players(player_frames, player_ids, player_boxes, ball_centers)
+    for frame_num in range(num_frames):
+        rows = np.flatnonzero(player_frames == frame_num)
+        players = {int(player_ids[row]): {"box": player_boxes[row].tolist()} for row in rows}
+        ball = ball_centers[frame_num]
+        expected = -1 if np.isnan(ball).any() else assigner.assign_ball_to_player(players, [*ball, *ball])
+        assert assigned_players[frame_num] == expected
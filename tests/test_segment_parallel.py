@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+from utils import read_video, worker_state
+from trackers import Tracker
+from trackers.detector_backends import ReplayBackend
+from camera_movement_estimator import CameraMovementEstimator
+from pipeline import segment_parallel
+from pipeline.segment_parallel import (_analyze_segment, plan_segments, reconcile_camera_movement,
+                                       process_video_segments, run_segment_parallel_pipeline)
+from benchmarks.synthetic import CLASS_NAMES, write_synthetic_video
+
+
+@pytest.fixture(scope="module")
+def panning_clip(tmp_path_factory):
+    video_path = str(tmp_path_factory.mktemp("segments") / "pan.avi")
+    detections = write_synthetic_video(video_path, num_frames=120, width=1280, height=720)
+    return video_path, detections
+
+
+def analyze_segments(video_path, detections, segments, camera_kwargs):
+    # The segment workers, run in this process; each segment replays its own frames' detections
+    results = []
+    for processed_start, _, stop in segments:
+        worker_state["tracker"] = Tracker(None, backend=ReplayBackend(detections[processed_start:stop], CLASS_NAMES))
+        results.append(_analyze_segment(video_path, processed_start, stop, camera_kwargs))
+    return results
+
+
+@pytest.mark.parametrize("method", ["max", "median"])
+def test_segment_camera_movement_matches_serial(panning_clip, method):
+    video_path, detections = panning_clip
+    frames = read_video(video_path)
+    serial = CameraMovementEstimator(frames[0], method=method).get_camera_movement(frames)
+
+    segments = plan_segments(len(frames), workers=4, segment_length=30, overlap=10)
+    results = analyze_segments(video_path, detections, segments, {"method": method})
+    reconcile_camera_movement(video_path, segments, results, {"method": method})
+    stitched = []
+    for (processed_start, owned_start, _), result in zip(segments, results):
+        stitched += result["camera_movement"][owned_start - processed_start:]
+    np.testing.assert_allclose(stitched, serial, atol=1e-4)
+
+
+def test_segments_of_an_unreadable_video(tmp_path):
+    missing = str(tmp_path / "missing.avi")
+    assert process_video_segments(missing, None, workers=2, tracker_kwargs={"backend": ReplayBackend([], CLASS_NAMES)}) is None
+    assert run_segment_parallel_pipeline(missing, str(tmp_path / "out.avi"), None, workers=2) is None
+
+
+@pytest.mark.parametrize("reported_frames", [0, 50])
+def test_segments_cover_frames_past_the_reported_count(panning_clip, tmp_path, monkeypatch, reported_frames):
+    video_path, detections = panning_clip
+    monkeypatch.setattr(segment_parallel, "get_video_properties", lambda path: {"frame_count": reported_frames})
+    # Every worker replays from the first frame, whichever segments it gets
+    tracker_kwargs = {"backend": ReplayBackend(detections * 4, CLASS_NAMES)}
+    output_path = str(tmp_path / "out.avi")
+    tracks = run_segment_parallel_pipeline(video_path, output_path, None, workers=2, segment_length=20, overlap=10,
+                                           tracker_kwargs=tracker_kwargs)
+    assert tracks.num_frames == len(detections)
+    assert len(read_video(output_path)) == len(detections)
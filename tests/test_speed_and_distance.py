@@ -0,0 +1,53 @@
+import numpy as np
+from speed_and_distance_estimator import SpeedAndDistanceEstimator
+from trackers import TrackTable
+
+FPS = 25.0
+STEP = 0.2  # metres per frame: 5 m/s, 18 km/h
+
+
+def walking_player(num_frames, missing):
+    # One player walking along the pitch at constant velocity, unseen on the missing frames
+    tracks = {
+        "players": [{} if frame_num in missing else {3: {"box": [0, 0, 10, 10]}} for frame_num in range(num_frames)],
+        "referees": [{} for _ in range(num_frames)],
+        "ball": [{} for _ in range(num_frames)],
+    }
+    table = TrackTable.from_tracks(tracks)
+    frames = table["frame"].astype(np.float32)
+    table.columns["position_transformed"] = np.stack([frames * STEP, np.full_like(frames, 30.0)], axis=1)
+    table.fields.add("position_transformed")
+    return table
+
+
+def test_speed_and_distance_across_short_gap():
+    table = walking_player(100, missing=range(40, 45))
+    SpeedAndDistanceEstimator(fps=FPS, frame_window=5, max_gap=10).add_speed_and_distance(table)
+
+    # Steady state, including right after the gap
+    for frame_num in (20, 45, 50, 99):
+        assert np.isclose(table["players"][frame_num][3]["speed"], 18.0, atol=1e-3)
+    # The step across the gap counts; the trailing mean lags the end by two frames
+    assert np.isclose(table["players"][99][3]["distance"], 99 * STEP - 2 * STEP, atol=1e-3)
+
+
+def test_distance_skips_long_gap():
+    table = walking_player(100, missing=range(60, 80))
+    SpeedAndDistanceEstimator(fps=FPS, frame_window=5, max_gap=10).add_speed_and_distance(table)
+
+    before_gap = 59 * STEP - 2 * STEP
+    after_gap = 19 * STEP - 2 * STEP
+    assert np.isclose(table["players"][59][3]["distance"], before_gap, atol=1e-3)
+    assert np.isclose(table["players"][99][3]["distance"], before_gap + after_gap, atol=1e-3)
+    assert np.isclose(table["players"][99][3]["speed"], 18.0, atol=1e-3)
+    # First frame after the gap has no earlier row to measure speed from, but keeps its distance
+    assert "speed" not in table["players"][80][3]
+    assert np.isclose(table["players"][80][3]["distance"], before_gap, atol=1e-3)
+
+
+def test_outlier_speed_keeps_distance():
+    table = walking_player(30, missing=())
+    SpeedAndDistanceEstimator(fps=FPS, frame_window=5, max_speed_kmh=10.0).add_speed_and_distance(table)
+    player = table["players"][20][3]
+    assert "speed" not in player
+    assert player["distance"] > 0
@@ -0,0 +1,136 @@
+import os
+import numpy as np
+import pytest
+from utils import read_video
+from stage_cache import StageCache
+from trackers import Tracker
+from trackers.detector_backends import ReplayBackend
+from camera_movement_estimator import CameraMovementEstimator
+from benchmarks.synthetic import CLASS_NAMES, write_synthetic_video
+
+
+class FailingBackend:
+    names = CLASS_NAMES
+
+    def preprocess(self, frames):
+        raise AssertionError("the detector should not run")
+
+
+@pytest.fixture(scope="module")
+def clip(tmp_path_factory):
+    root = tmp_path_factory.mktemp("clip")
+    video_path = str(root / "clip.avi")
+    detections = write_synthetic_video(video_path, num_frames=30, width=320, height=180)
+    other_video_path = str(root / "other.avi")
+    write_synthetic_video(other_video_path, num_frames=30, width=320, height=180, seed=1)
+    model_path = str(root / "model.pt")
+    with open(model_path, "wb") as file:
+        file.write(b"weights")
+    return video_path, other_video_path, model_path, detections, read_video(video_path)
+
+
+@pytest.fixture
+def cached_clip(clip, tmp_path):
+    video_path, _, model_path, detections, frames = clip
+    cache = StageCache(str(tmp_path / "cache"))
+    tracker = Tracker(model_path, backend=ReplayBackend(detections, CLASS_NAMES))
+    tracks = tracker.get_object_tracks(frames, cache=cache, video_path=video_path)
+    return cache, tracks
+
+
+def replay_tracker(model_path, backend=None):
+    return Tracker(model_path, backend=backend or FailingBackend())
+
+
+def test_unchanged_inputs_hit_the_cache(clip, cached_clip):
+    video_path, _, model_path, _, frames = clip
+    cache, tracks = cached_clip
+    tracker = replay_tracker(model_path)
+    assert tracker.get_object_tracks(frames, cache=cache, video_path=video_path) == \
+        tracker.load_cached_tracks(cache, video_path)
+    assert tracker.detector_calls == 0
+
+
+def test_changed_video_misses_the_cache(clip, cached_clip):
+    _, other_video_path, model_path, _, _ = clip
+    cache, _ = cached_clip
+    tracker = replay_tracker(model_path)
+    assert tracker.load_cached_tracks(cache, other_video_path) is None
+    assert tracker.load_cached_detections(cache, other_video_path) is None
+
+
+def test_changed_model_misses_the_cache(clip, cached_clip, tmp_path):
+    video_path, _, _, _, _ = clip
+    cache, _ = cached_clip
+    other_model_path = str(tmp_path / "other.pt")
+    with open(other_model_path, "wb") as file:
+        file.write(b"other weights")
+    tracker = replay_tracker(other_model_path)
+    assert tracker.load_cached_tracks(cache, video_path) is None
+    assert tracker.load_cached_detections(cache, video_path) is None
+
+
+def test_changed_confidence_misses_the_cache(clip, cached_clip):
+    video_path, _, model_path, _, _ = clip
+    cache, _ = cached_clip
+    tracker = replay_tracker(model_path)
+    tracker.conf = 0.3
+    assert tracker.load_cached_tracks(cache, video_path) is None
+    assert tracker.load_cached_detections(cache, video_path) is None
+
+
+def test_changed_tracker_params_replay_cached_detections(clip, cached_clip):
+    video_path, _, model_path, _, frames = clip
+    cache, _ = cached_clip
+    tracker = replay_tracker(model_path)
+    tracker.tracker_params = {"lost_track_buffer": 5}
+    assert tracker.load_cached_tracks(cache, video_path) is None
+    tracks = tracker.get_object_tracks(frames, cache=cache, video_path=video_path)
+    assert len(tracks["players"]) == len(frames)
+    assert tracker.detector_calls == 0
+    # The retracked result is cached under the new parameters
+    assert tracker.load_cached_tracks(cache, video_path) is not None
+
+
+def test_sub_range_is_served_from_a_complete_entry(clip, cached_clip):
+    video_path, _, model_path, _, _ = clip
+    cache, _ = cached_clip
+    tracker = replay_tracker(model_path)
+    full = tracker.load_cached_tracks(cache, video_path)
+    part = tracker.load_cached_tracks(cache, video_path, frame_range=(5, 15))
+    assert part == {name: object_tracks[5:15] for name, object_tracks in full.items()}
+
+    detections = list(tracker.load_cached_detections(cache, video_path, frame_range=(5, 15)))
+    all_detections = list(tracker.load_cached_detections(cache, video_path))
+    assert len(detections) == 10
+    for detection, expected in zip(detections, all_detections[5:15]):
+        np.testing.assert_array_equal(detection.xyxy, expected.xyxy)
+
+
+@pytest.mark.parametrize("changed", [{"lk_params": {"winSize": (21, 21)}}, {"method": "median"}])
+def test_changed_camera_parameters_miss_the_cache(clip, tmp_path, changed):
+    video_path, _, _, _, frames = clip
+    cache = StageCache(str(tmp_path / "cache"))
+    estimator = CameraMovementEstimator(frames[0])
+    camera_movement = estimator.get_camera_movement(frames, cache=cache, video_path=video_path)
+    assert CameraMovementEstimator(frames[0]).load_cached_camera_movement(cache, video_path) == camera_movement
+
+    other = CameraMovementEstimator(frames[0], method=changed.get("method", "max"))
+    other.lk_params.update(changed.get("lk_params", {}))
+    assert other.load_cached_camera_movement(cache, video_path) is None
+
+
+def test_evict_removes_least_recently_used_entries_first(tmp_path):
+    cache = StageCache(str(tmp_path / "cache"))
+    array = {"values": np.zeros(1000, dtype=np.float64)}
+    paths = {name: cache.save("stage", cache.key("stage", name=name), array, 0, 10) for name in "abc"}
+    for mtime, name in enumerate("abc", 1000):
+        os.utime(os.path.join(paths[name], "meta.json"), (mtime, mtime))
+
+    # Loading "a" marks it as the most recently used
+    assert cache.load("stage", cache.key("stage", name="a"), 0, 10) is not None
+    sizes = {name: sum(os.path.getsize(os.path.join(path, file)) for file in os.listdir(path))
+             for name, path in paths.items()}
+    cache.max_bytes = sizes["a"] + sizes["c"]
+    cache.evict()
+    assert [os.path.exists(paths[name]) for name in "abc"] == [True, False, True]
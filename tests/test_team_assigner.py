@@ -0,0 +1,82 @@
+import numpy as np
+from team_assigner import TeamAssigner
+from team_assigner.team_assigner import two_means, farthest_pair_init, fit_two_means
+
+TEAM_COLORS = np.array([[40, 40, 220], [220, 60, 40]], dtype=np.float32)
+
+
+def two_team_colors(rng, players_per_team=10, outliers=((255, 255, 255),)):
+    colors = np.concatenate([TEAM_COLORS[0] + rng.normal(0, 8, (players_per_team, 3)),
+                             TEAM_COLORS[1] + rng.normal(0, 8, (players_per_team, 3)),
+                             np.array(outliers, dtype=np.float32).reshape(-1, 3)])
+    return colors.astype(np.float32)
+
+
+def inertia(points, labels, centers):
+    return float(((points - centers[labels]) ** 2).sum())
+
+
+def match_error(centers):
+    # Distance from the fitted centers to the true team colors, in whichever order they came out
+    straight = np.abs(centers - TEAM_COLORS).max()
+    swapped = np.abs(centers[::-1] - TEAM_COLORS).max()
+    return min(straight, swapped)
+
+
+def test_outlier_crop_does_not_become_a_team_color():
+    rng = np.random.default_rng(0)
+    for _ in range(20):
+        colors = two_team_colors(rng)
+        labels, centers = fit_two_means(colors)
+        assert match_error(centers) < 30
+        # Never worse than the single deterministic seeding
+        seeded_labels, seeded_centers = two_means(colors[None], farthest_pair_init(colors[None]), iterations=20)
+        assert inertia(colors, labels, centers) <= inertia(colors, seeded_labels[0], seeded_centers[0]) + 1e-3
+
+
+def test_team_assigner_fits_teams_with_an_outlier_crop():
+    rng = np.random.default_rng(1)
+    colors = two_team_colors(rng)
+    frame = np.zeros((100, 40 * len(colors), 3), dtype=np.uint8)
+    detections = {}
+    for idx, color in enumerate(colors):
+        frame[:, 40 * idx:40 * idx + 40] = np.clip(color, 0, 255)
+        detections[idx + 1] = {"box": [40 * idx, 0, 40 * idx + 40, 100]}
+
+    team_assigner = TeamAssigner()
+    team_assigner.assign_team_color(frame, detections)
+    centers = np.stack([team_assigner.team_colors[1], team_assigner.team_colors[2]])
+    assert match_error(centers) < 30
+
+
+def voting_assigner(vote_window=5):
+    team_assigner = TeamAssigner(vote_window=vote_window, vote_interval=1)
+    team_assigner.team_colors = {1: TEAM_COLORS[0].astype(np.float64), 2: TEAM_COLORS[1].astype(np.float64)}
+    return team_assigner
+
+
+def jersey_frame(team):
+    # One player, track 7, filling the frame in the given team's color
+    frame = np.zeros((100, 40, 3), dtype=np.uint8)
+    frame[:] = TEAM_COLORS[team - 1]
+    return frame, {7: {"box": [0, 0, 40, 100]}}
+
+
+def test_rolling_vote_follows_the_later_majority():
+    team_assigner = voting_assigner(vote_window=5)
+    teams = []
+    for team in [1, 1, 1, 2, 2, 2, 2, 2]:
+        teams.append(team_assigner.update_player_teams(*jersey_frame(team))[7])
+
+    # Early votes hold until the later ones outnumber them, then drop out of the window
+    assert teams == [1, 1, 1, 1, 1, 2, 2, 2]
+    assert list(team_assigner.player_votes[7]) == [2, 2, 2, 2, 2]
+    assert team_assigner.player_team_dict == {7: 2}
+
+
+def test_tied_votes_go_to_the_latest_vote():
+    team_assigner = voting_assigner(vote_window=4)
+    teams = [team_assigner.update_player_teams(*jersey_frame(team))[7] for team in [1, 2, 1, 2, 2, 1]]
+    # Ties at [1, 2] and [1, 2, 1, 2], then [2, 1, 2, 2] and the tied window [1, 2, 2, 1]
+    assert teams == [1, 2, 1, 2, 2, 1]
+    assert team_assigner.player_team_dict[7] == 1
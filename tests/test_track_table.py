@@ -0,0 +1,24 @@
+import numpy as np
+from trackers import TrackTable
+
+
+def single_team_tracks(num_frames=3):
+    return {
+        "players": [{7: {"box": [100, 100, 120, 160]}} for _ in range(num_frames)],
+        "referees": [{} for _ in range(num_frames)],
+        "ball": [{} for _ in range(num_frames)],
+    }
+
+
+def test_set_teams_with_only_one_team_in_clip():
+    table = TrackTable.from_tracks(single_team_tracks())
+    table.set_teams({7: 1}, {1: (0, 0, 255), 2: (255, 0, 0)})
+    assert (table["team"][table.class_mask("players")] == 1).all()
+    assert table["players"][0][7]["team_color"] == (0.0, 0.0, 255.0)
+
+
+def test_set_teams_with_only_the_second_team_in_clip():
+    table = TrackTable.from_tracks(single_team_tracks())
+    table.set_teams({7: 2}, {1: (0, 0, 255), 2: (255, 0, 0)})
+    assert table["players"][2][7]["team"] == 2
+    assert np.allclose(table["players"][2][7]["team_color"], (255, 0, 0))
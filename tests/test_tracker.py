@@ -0,0 +1,28 @@
+import numpy as np
+from trackers import Tracker
+from player_ball_assigner import PossessionStats
+
+
+def test_draw_team_ball_control_reuses_possession_stats_of_a_raw_array():
+    tracker = Tracker(None)
+    team_ball_control = [0, 1, 1, 2, 1, 2, 2, 2]
+    expected = PossessionStats(team_ball_control)
+    frame = np.zeros((1080, 1920, 3), dtype=np.uint8)
+
+    stats = None
+    for frame_num in range(len(team_ball_control)):
+        tracker.draw_team_ball_control(frame, frame_num, team_ball_control)
+        assert stats is None or tracker._possession_stats is stats
+        stats = tracker._possession_stats
+        assert np.allclose(stats.percentages(frame_num), expected.percentages(frame_num))
+    assert stats.num_frames == len(team_ball_control)
+
+
+def test_draw_team_ball_control_follows_a_growing_array():
+    tracker = Tracker(None)
+    team_ball_control = []
+    frame = np.zeros((1080, 1920, 3), dtype=np.uint8)
+    for frame_num, team in enumerate([1, 1, 2, 0, 2]):
+        team_ball_control.append(team)
+        tracker.draw_team_ball_control(frame, frame_num, team_ball_control)
+    assert np.allclose(tracker._possession_stats.percentages(4), PossessionStats(team_ball_control).percentages(4))
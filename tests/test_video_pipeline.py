@@ -0,0 +1,52 @@
+import numpy as np
+from trackers import Tracker
+from trackers.detector_backends import ReplayBackend
+from camera_movement_estimator import CameraMovementEstimator
+from team_assigner import TeamAssigner
+from pipeline import analyze_frames
+from benchmarks.synthetic import CLASS_NAMES, SyntheticMatch
+
+
+class RecordingReplayBackend(ReplayBackend):
+    def __init__(self, detections, names):
+        super().__init__(detections, names)
+        self.batch_sizes = []
+
+    def preprocess(self, frames):
+        self.batch_sizes.append(len(frames))
+        return super().preprocess(frames)
+
+
+def synthetic_clip(num_frames=80):
+    match = SyntheticMatch(num_frames, width=320, height=180, players_per_team=4)
+    frames, detections = zip(*match.frames())
+    return list(frames), list(detections)
+
+
+def analyze(frames, detections, batch_size=None, keep_detections=True):
+    backend = RecordingReplayBackend(detections, CLASS_NAMES)
+    tracker = Tracker(None, backend=backend, batch_size=batch_size)
+    tracks, camera_movement_per_frame, frame_detections = analyze_frames(
+        iter(frames), tracker, CameraMovementEstimator(frames[0]), TeamAssigner(), keep_detections=keep_detections
+    )
+    return tracks, camera_movement_per_frame, frame_detections, backend.batch_sizes
+
+
+def test_analyze_frames_follows_the_adaptive_batch_size():
+    frames, detections = synthetic_clip()
+    tracks, camera_movement_per_frame, frame_detections, batch_sizes = analyze(frames, detections)
+    assert sum(batch_sizes) == len(frames)
+    assert len(set(batch_sizes[:-1])) > 1
+    assert len(frame_detections) == len(camera_movement_per_frame) == len(tracks["players"]) == len(frames)
+
+    fixed_tracks, fixed_camera_movement, _, fixed_batch_sizes = analyze(frames, detections, batch_size=4)
+    assert set(fixed_batch_sizes[:-1]) == {4}
+    assert tracks == fixed_tracks
+    assert np.allclose(camera_movement_per_frame, fixed_camera_movement)
+
+
+def test_analyze_frames_keeps_detections_only_when_asked():
+    frames, detections = synthetic_clip(20)
+    tracks, _, frame_detections, _ = analyze(frames, detections, keep_detections=False)
+    assert frame_detections == []
+    assert len(tracks["players"]) == len(frames)
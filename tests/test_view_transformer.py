@@ -0,0 +1,21 @@
+import numpy as np
+from view_transformer import ViewTransformer
+from view_transformer.view_transformer import PIXEL_VERTICES, PITCH_VERTICES
+
+
+def test_corners_map_to_pitch_vertices():
+    transformer = ViewTransformer()
+    transformed = transformer.transform_points(PIXEL_VERTICES)
+    assert np.allclose(transformed, PITCH_VERTICES, atol=1e-3)
+
+
+def test_inside_and_outside_points():
+    transformer = ViewTransformer()
+    center = np.mean(PIXEL_VERTICES, axis=0)
+    points = np.array([center, (0, 0), (1900, 1070), (900, 200)], dtype=np.float32)
+    assert transformer.inside(points).tolist() == [True, False, False, False]
+
+    transformed = transformer.transform_points(np.vstack([points, [np.nan, np.nan]]))
+    assert np.isfinite(transformed[0]).all()
+    assert 0 < transformed[0][0] < PITCH_VERTICES[2][0] and 0 < transformed[0][1] < PITCH_VERTICES[0][1]
+    assert np.isnan(transformed[1:]).all()
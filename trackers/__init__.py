@@ -1 +1,3 @@
-from .tracker import Tracker
\ No newline at end of file
+from .tracker import Tracker
+from .track_table import TrackTable
+from .ball_trajectory import BallCandidateSelector, StreamingBallInterpolator, select_ball_boxes, interpolate_ball_boxes
@@ -0,0 +1,184 @@
+from collections import deque
+import numpy as np
+
+# Gaps longer than this many frames are left empty instead of being filled with a guessed path
+BALL_MAX_GAP = 30
+INTERPOLATION_METHODS = ("linear", "spline")
+
+
+def box_centers(boxes):
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    return (boxes[:, :2] + boxes[:, 2:]) / 2
+
+
+class BallCandidateSelector:
+    # Picks at most one ball box per frame from all ball detections of that frame. Candidates farther than
+    # max_speed pixels per frame from the last accepted ball are rejected as implausible; the rest are scored
+    # by confidence minus a continuity penalty growing with the jump. The anchor is dropped after max_missed
+    # frames without an accepted ball, or after reacquire_frames frames in a row whose every candidate was
+    # rejected, so a wrong anchor does not lock out the real ball and the ball is found again after a cut.
+    def __init__(self, max_speed=80.0, continuity_weight=0.5, max_missed=12, reacquire_frames=3):
+        self.max_speed = max_speed
+        self.continuity_weight = continuity_weight
+        self.max_missed = max_missed
+        self.reacquire_frames = reacquire_frames
+        self.reset()
+
+    def reset(self):
+        self.last_center = None
+        self.frames_since_accept = 0
+        self.rejected_streak = 0
+
+    def select(self, boxes, confidences=None):
+        # Returns the index of the chosen candidate, or None when no candidate is plausible
+        self.frames_since_accept += 1
+        centers = box_centers(boxes)
+        if len(centers) == 0:
+            self.rejected_streak = 0
+            return None
+        confidences = np.ones(len(centers)) if confidences is None else np.asarray(confidences, dtype=np.float64)
+
+        if self.last_center is not None and (self.frames_since_accept > self.max_missed
+                                             or self.rejected_streak >= self.reacquire_frames):
+            self.reset()
+
+        scores = confidences.copy()
+        if self.last_center is not None:
+            allowed = self.max_speed * self.frames_since_accept
+            jumps = np.linalg.norm(centers - self.last_center, axis=1)
+            scores -= self.continuity_weight * jumps / allowed
+            scores[jumps > allowed] = -np.inf
+
+        best = int(scores.argmax())
+        if not np.isfinite(scores[best]):
+            self.rejected_streak += 1
+            return None
+        self.last_center = centers[best]
+        self.frames_since_accept = 0
+        self.rejected_streak = 0
+        return best
+
+
+def select_ball_boxes(frames, boxes, confidences, num_frames, **selector_kwargs):
+    # Offline selection over flat candidate arrays sorted by frame: returns (num_frames, 4) with NaN rows
+    # on frames without an accepted ball
+    frames = np.asarray(frames, dtype=np.int64)
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    offsets = np.searchsorted(frames, np.arange(num_frames + 1))
+    selector = BallCandidateSelector(**selector_kwargs)
+    selected = np.full((num_frames, 4), np.nan)
+    for frame_num in range(num_frames):
+        rows = slice(offsets[frame_num], offsets[frame_num + 1])
+        best = selector.select(boxes[rows], confidences[rows])
+        if best is not None:
+            selected[frame_num] = boxes[rows][best]
+    return selected
+
+
+def _known_tangents(values, known_idx):
+    # Per-frame velocity at every known point: central differences between its known neighbours,
+    # one-sided at the ends
+    if len(known_idx) < 2:
+        return np.zeros((len(known_idx), values.shape[1]))
+    before = np.concatenate([known_idx[:1], known_idx[:-1]])
+    after = np.concatenate([known_idx[1:], known_idx[-1:]])
+    return (values[after] - values[before]) / (after - before)[:, None]
+
+
+def interpolate_ball_boxes(boxes, max_gap=BALL_MAX_GAP, method="linear"):
+    # Fills NaN rows of a (N, 4) box array. Interior gaps of at most max_gap frames are filled linearly or with
+    # a cubic Hermite spline through the neighbouring detections; up to max_gap frames before the first and
+    # after the last detection take the nearest detection. max_gap=None fills every gap.
+    if method not in INTERPOLATION_METHODS:
+        raise ValueError(f"Unknown interpolation method {method!r}, expected one of {INTERPOLATION_METHODS}")
+    boxes = np.array(boxes, dtype=np.float64).reshape(-1, 4)
+    num_frames = len(boxes)
+    known = ~np.isnan(boxes).any(axis=1)
+    known_idx = np.flatnonzero(known)
+    if len(known_idx) == 0 or len(known_idx) == num_frames:
+        return boxes
+    max_gap = num_frames if max_gap is None else max_gap
+
+    frames = np.arange(num_frames)
+    previous = np.maximum.accumulate(np.where(known, frames, -1))
+    following = np.minimum.accumulate(np.where(known, frames, num_frames)[::-1])[::-1]
+
+    interior = ~known & (previous >= 0) & (following < num_frames) & (following - previous - 1 <= max_gap)
+    if interior.any():
+        start, stop = previous[interior], following[interior]
+        span = (stop - start).astype(np.float64)[:, None]
+        t = (frames[interior] - start)[:, None] / span
+        if method == "linear":
+            filled = boxes[start] + t * (boxes[stop] - boxes[start])
+        else:
+            tangents = np.zeros_like(boxes)
+            tangents[known_idx] = _known_tangents(boxes, known_idx)
+            t2, t3 = t * t, t * t * t
+            filled = ((2 * t3 - 3 * t2 + 1) * boxes[start] + (t3 - 2 * t2 + t) * span * tangents[start]
+                      + (-2 * t3 + 3 * t2) * boxes[stop] + (t3 - t2) * span * tangents[stop])
+        boxes[interior] = filled
+
+    leading = ~known & (previous < 0) & (following - frames <= max_gap)
+    boxes[leading] = boxes[following[leading]]
+    trailing = ~known & (following >= num_frames) & (previous >= 0) & (frames - previous <= max_gap)
+    boxes[trailing] = boxes[previous[trailing]]
+    return boxes
+
+
+class StreamingBallInterpolator:
+    # Incremental counterpart of interpolate_ball_boxes: push one box (or None) per frame and get back the
+    # boxes of the frames that are final, in order. A frame is held back for at most max_gap frames, while
+    # it may still be filled by a later detection. In linear mode the output matches interpolate_ball_boxes
+    # over the whole stream, except when the stream ends with a miss longer than max_gap: offline the first
+    # max_gap frames of that miss take the last detection, here they have already been emitted empty.
+    # Spline mode only sees past detections, so its tangents differ from the offline fill.
+    def __init__(self, max_gap=BALL_MAX_GAP, method="linear", context=2):
+        self.max_gap = max_gap
+        self.method = method
+        # The last emitted frames, all with a box, used as support for the next fill
+        self.history = deque(maxlen=max(context, 1))
+        self.pending = 0
+        self.gap_expired = False
+
+    def _fill(self, new_box=None):
+        window = np.full((len(self.history) + self.pending + (new_box is not None), 4), np.nan)
+        if self.history:
+            window[:len(self.history)] = np.array(self.history, dtype=np.float64)
+        if new_box is not None:
+            window[-1] = new_box
+        return interpolate_ball_boxes(window, self.max_gap, self.method)[len(self.history):]
+
+    def _as_output(self, boxes):
+        return [None if np.isnan(box).any() else box.tolist() for box in boxes]
+
+    def push(self, box):
+        if box is None:
+            if self.gap_expired:
+                return [None]
+            self.pending += 1
+            if self.max_gap is None or self.pending <= self.max_gap:
+                return []
+            if not self.history:
+                # Before the first box only the last max_gap frames can still be filled from it
+                self.pending -= 1
+                return [None]
+            # Too long to be filled, the gap stays empty up to the next box
+            output = [None] * self.pending
+            self.pending, self.gap_expired = 0, True
+            return output
+
+        box = np.asarray(box, dtype=np.float64)
+        if self.gap_expired:
+            self.history.clear()
+        filled = self._fill(box)
+        self.history.extend(filled)
+        self.pending, self.gap_expired = 0, False
+        return self._as_output(filled)
+
+    def flush(self):
+        # Emits the frames still held back at the end of the stream
+        if not self.pending:
+            return []
+        output = self._as_output(self._fill()) if self.history else [None] * self.pending
+        self.pending = 0
+        return output
@@ -0,0 +1,183 @@
+import ast
+import os
+import sys
+import cv2 as cv
+import numpy as np
+sys.path.append("../")
+from utils import FrameContext, as_frame
+
+
+class UltralyticsBackend:
+    def __init__(self, model_path):
+        from ultralytics import YOLO
+        self.model = YOLO(model_path)
+        self.names = dict(self.model.names)
+
+    def preprocess(self, frames):
+        # ultralytics letterboxes internally
+        return [as_frame(frame) for frame in frames]
+
+    def infer(self, frames, conf):
+        import supervision as sv
+        detections = []
+        for result in self.model.predict(frames, conf=conf, verbose=False):
+            self.names = result.names
+            detections.append(sv.Detections.from_ultralytics(result))
+        return detections
+
+
+class OnnxRuntimeBackend:
+    # Runs a YOLO model exported to ONNX (e.g. `yolo export format=onnx`) with ONNX Runtime on CPU.
+    # Handles both the YOLOv8-style (B, 4 + classes, N) and YOLOv5-style (B, N, 5 + classes) outputs.
+    def __init__(self, model_path, imgsz=640, iou=0.45, threads=None):
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        # A fixed batch dimension means the graph was exported for one image at a time
+        self.fixed_batch = model_input.shape[0] if isinstance(model_input.shape[0], int) else None
+        height, width = model_input.shape[2:4]
+        self.imgsz = (height, width) if isinstance(height, int) and isinstance(width, int) else (imgsz, imgsz)
+        self.iou = iou
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        self.names = ast.literal_eval(metadata["names"]) if "names" in metadata else {}
+
+    def letterbox(self, frame):
+        height, width = self.imgsz
+        scale = min(height / frame.shape[0], width / frame.shape[1])
+        resized = cv.resize(frame, (round(frame.shape[1] * scale), round(frame.shape[0] * scale)),
+                            interpolation=cv.INTER_LINEAR)
+        pad_y, pad_x = (height - resized.shape[0]) // 2, (width - resized.shape[1]) // 2
+        canvas = np.full((height, width, 3), 114, dtype=np.uint8)
+        canvas[pad_y:pad_y + resized.shape[0], pad_x:pad_x + resized.shape[1]] = resized
+        return canvas, (scale, pad_x, pad_y)
+
+    def preprocess(self, frames):
+        # The letterboxed input is kept on FrameContexts, e.g. for a second pass over the same frames
+        letterboxed = [
+            frame.derived(("letterbox", self.imgsz), lambda frame=frame: self.letterbox(frame.frame))
+            if isinstance(frame, FrameContext) else self.letterbox(frame)
+            for frame in frames
+        ]
+        blob = np.stack([image for image, _ in letterboxed])[..., ::-1].transpose(0, 3, 1, 2)
+        blob = np.ascontiguousarray(blob, dtype=np.float32) / 255.0
+        return blob, [transform for _, transform in letterboxed]
+
+    def _run(self, blob):
+        if self.fixed_batch is None or self.fixed_batch == len(blob):
+            return self.session.run(None, {self.input_name: blob})[0]
+        return np.concatenate([self.session.run(None, {self.input_name: blob[i:i + 1]})[0] for i in range(len(blob))])
+
+    def _decode(self, output, conf):
+        num_classes = len(self.names)
+        if output.shape[0] == 4 + num_classes or (not num_classes and output.shape[0] < output.shape[1]):
+            # YOLOv8 layout: (4 + classes, N), no objectness
+            output = output.T
+            boxes, class_scores = output[:, :4], output[:, 4:]
+            scores = class_scores.max(axis=1)
+        else:
+            boxes, objectness, class_scores = output[:, :4], output[:, 4], output[:, 5:]
+            scores = class_scores.max(axis=1) * objectness
+        class_id = class_scores.argmax(axis=1)
+        keep = scores >= conf
+        boxes, scores, class_id = boxes[keep], scores[keep], class_id[keep]
+        # cx, cy, w, h -> x1, y1, x2, y2
+        xyxy = np.concatenate([boxes[:, :2] - boxes[:, 2:] / 2, boxes[:, :2] + boxes[:, 2:] / 2], axis=1)
+        return xyxy, scores, class_id
+
+    def infer(self, prepared, conf):
+        import supervision as sv
+        blob, transforms = prepared
+        outputs = self._run(blob)
+        detections = []
+        for output, (scale, pad_x, pad_y) in zip(outputs, transforms):
+            xyxy, scores, class_id = self._decode(output, conf)
+            if len(xyxy):
+                xywh = np.concatenate([xyxy[:, :2], xyxy[:, 2:] - xyxy[:, :2]], axis=1)
+                keep = np.asarray(cv.dnn.NMSBoxesBatched(xywh.tolist(), scores.tolist(), class_id.tolist(),
+                                                         conf, self.iou), dtype=np.int64).reshape(-1)
+                xyxy, scores, class_id = xyxy[keep], scores[keep], class_id[keep]
+            xyxy = (xyxy - [pad_x, pad_y, pad_x, pad_y]) / scale
+            detections.append(sv.Detections(xyxy=xyxy.astype(np.float32).reshape(-1, 4),
+                                            confidence=scores.astype(np.float32),
+                                            class_id=class_id.astype(int)))
+        return detections
+
+
+class ReplayBackend:
+    # Plays back precomputed detections in frame order instead of running a model, so the rest of the
+    # pipeline can run offline (benchmarks, canned detection stubs)
+    def __init__(self, detections, names):
+        self.detections = iter(detections)
+        self.names = dict(names)
+
+    def preprocess(self, frames):
+        return len(frames)
+
+    def infer(self, prepared, conf):
+        detections = [next(self.detections) for _ in range(prepared)]
+        return [detection[detection.confidence >= conf] if detection.confidence is not None else detection
+                for detection in detections]
+
+
+def create_backend(model_path, backend=None):
+    # backend may also be a ready backend instance
+    if backend is not None and not isinstance(backend, str):
+        return backend
+    if backend is None:
+        backend = "onnxruntime" if os.path.splitext(model_path)[1].lower() == ".onnx" else "ultralytics"
+    if backend == "onnxruntime":
+        return OnnxRuntimeBackend(model_path)
+    if backend == "ultralytics":
+        return UltralyticsBackend(model_path)
+    raise ValueError(f"Unknown detector backend {backend!r}")
+
+
+def available_memory_bytes():
+    try:
+        import psutil
+        return psutil.virtual_memory().available
+    except ImportError:
+        pass
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+class AdaptiveBatchSizer:
+    # Picks the detector batch size: capped by available memory, then grown while the measured
+    # per-frame latency keeps improving and settled on the fastest size seen.
+    def __init__(self, initial=4, min_batch=1, max_batch=64, memory_fraction=0.25, bytes_per_frame_overhead=8):
+        self.batch_size = initial
+        self.min_batch = min_batch
+        self.max_batch = max_batch
+        self.memory_fraction = memory_fraction
+        self.bytes_per_frame_overhead = bytes_per_frame_overhead
+        self.latencies = {}
+        self.settled = False
+
+    def memory_cap(self, frame):
+        available = available_memory_bytes()
+        if available is None or frame is None:
+            return self.max_batch
+        per_frame = frame.nbytes * self.bytes_per_frame_overhead
+        return int(np.clip(available * self.memory_fraction // per_frame, self.min_batch, self.max_batch))
+
+    def record(self, batch_size, seconds, frame=None):
+        per_frame = seconds / max(batch_size, 1)
+        previous = self.latencies.get(batch_size)
+        self.latencies[batch_size] = per_frame if previous is None else 0.8 * previous + 0.2 * per_frame
+        cap = self.memory_cap(frame)
+        if self.settled or batch_size < self.batch_size:
+            self.batch_size = min(self.batch_size, cap)
+            return
+        best = min(self.latencies, key=self.latencies.get)
+        if best == batch_size and batch_size * 2 <= cap:
+            self.batch_size = batch_size * 2
+        else:
+            self.batch_size = min(best, cap)
+            self.settled = True
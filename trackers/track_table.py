@@ -0,0 +1,202 @@
+import numpy as np
+
+OBJECT_CLASSES = ("players", "referees", "ball")
+
+
+class TrackTable:
+    # Columnar store for tracks: one row per (frame, class, track_id), rows sorted in that order,
+    # with per-frame/per-class offsets so a frame's objects are a contiguous slice.
+    def __init__(self, columns, num_frames, fields=()):
+        self.columns = columns
+        self.num_frames = int(num_frames)
+        self.fields = set(fields)
+        self._build_index()
+
+    @classmethod
+    def empty_columns(cls, num_rows):
+        return {
+            "frame": np.zeros(num_rows, dtype=np.int32),
+            "cls": np.zeros(num_rows, dtype=np.int8),
+            "track_id": np.zeros(num_rows, dtype=np.int64),
+            "box": np.zeros((num_rows, 4), dtype=np.float32),
+            "position": np.zeros((num_rows, 2), dtype=np.float32),
+            "position_adjusted": np.zeros((num_rows, 2), dtype=np.float32),
+            "team": np.zeros(num_rows, dtype=np.int8),
+            "team_color": np.zeros((num_rows, 3), dtype=np.float32),
+            "has_ball": np.zeros(num_rows, dtype=bool),
+        }
+
+    @classmethod
+    def from_tracks(cls, tracks):
+        frames, classes, track_ids, boxes = [], [], [], []
+        num_frames = max(len(tracks.get(object_name, [])) for object_name in OBJECT_CLASSES)
+        for cls_idx, object_name in enumerate(OBJECT_CLASSES):
+            for frame_num, track in enumerate(tracks.get(object_name, [])):
+                for track_id, track_info in track.items():
+                    box = track_info.get("box")
+                    if box is None or len(box) != 4:
+                        continue
+                    frames.append(frame_num)
+                    classes.append(cls_idx)
+                    track_ids.append(track_id)
+                    boxes.append(box)
+
+        columns = cls.empty_columns(len(frames))
+        columns["frame"][:] = frames
+        columns["cls"][:] = classes
+        columns["track_id"][:] = track_ids
+        if boxes:
+            columns["box"][:] = boxes
+
+        order = np.lexsort((columns["track_id"], columns["cls"], columns["frame"]))
+        columns = {name: column[order] for name, column in columns.items()}
+        return cls(columns, num_frames)
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        arrays = dict(arrays)
+        num_frames = int(arrays.pop("num_frames"))
+        fields = [str(field) for field in arrays.pop("fields", [])]
+        return cls({name: np.asarray(column) for name, column in arrays.items()}, num_frames, fields)
+
+    def to_arrays(self):
+        arrays = dict(self.columns)
+        arrays["num_frames"] = np.array(self.num_frames)
+        arrays["fields"] = np.array(sorted(self.fields), dtype=str)
+        return arrays
+
+    def slice_frames(self, start, stop=None):
+        # Copies out [start, stop) with frames renumbered from 0; cheap on memory-mapped columns
+        stop = self.num_frames if stop is None else stop
+        n_classes = len(OBJECT_CLASSES)
+        rows = slice(self.offsets[start * n_classes], self.offsets[stop * n_classes])
+        columns = {name: np.array(column[rows]) for name, column in self.columns.items()}
+        columns["frame"] -= start
+        return TrackTable(columns, stop - start, self.fields)
+
+    def _build_index(self):
+        # offsets[frame * n_classes + cls] is the first row of that class in that frame
+        keys = self.columns["frame"].astype(np.int64) * len(OBJECT_CLASSES) + self.columns["cls"]
+        self.offsets = np.searchsorted(keys, np.arange(self.num_frames * len(OBJECT_CLASSES) + 1))
+
+    def __len__(self):
+        return len(self.columns["frame"])
+
+    def __getitem__(self, key):
+        # tracks["players"][frame_num] keeps working for the drawing code
+        if key in OBJECT_CLASSES:
+            return TrackTableObjectView(self, OBJECT_CLASSES.index(key))
+        return self.columns[key]
+
+    def __contains__(self, key):
+        return key in OBJECT_CLASSES or key in self.columns
+
+    def keys(self):
+        return OBJECT_CLASSES
+
+    def rows(self, object_name, frame_num):
+        cls_idx = OBJECT_CLASSES.index(object_name)
+        idx = frame_num * len(OBJECT_CLASSES) + cls_idx
+        return slice(self.offsets[idx], self.offsets[idx + 1])
+
+    def class_mask(self, object_name):
+        return self.columns["cls"] == OBJECT_CLASSES.index(object_name)
+
+    def add_positions(self):
+        box = self.columns["box"]
+        center_x = np.trunc((box[:, 0] + box[:, 2]) / 2)
+        # Ball position is the box center, everything else is the foot position
+        y = np.where(
+            self.columns["cls"] == OBJECT_CLASSES.index("ball"),
+            np.trunc((box[:, 1] + box[:, 3]) / 2),
+            np.trunc(box[:, 3]),
+        )
+        self.columns["position"] = np.stack([center_x, y], axis=1).astype(np.float32)
+        self.fields.add("position")
+
+    def add_adjusted_positions(self, camera_movement_per_frame):
+        camera_movement = np.asarray(camera_movement_per_frame, dtype=np.float32).reshape(-1, 2)
+        self.columns["position_adjusted"] = self.columns["position"] - camera_movement[self.columns["frame"]]
+        self.fields.add("position_adjusted")
+
+    def set_teams(self, player_team_dict, team_colors):
+        if not player_team_dict:
+            return
+        ids = np.fromiter(player_team_dict.keys(), dtype=np.int64, count=len(player_team_dict))
+        teams = np.fromiter(player_team_dict.values(), dtype=np.int8, count=len(player_team_dict))
+        order = np.argsort(ids)
+        ids, teams = ids[order], teams[order]
+
+        players = np.flatnonzero(self.class_mask("players"))
+        player_ids = self.columns["track_id"][players]
+        idx = np.clip(np.searchsorted(ids, player_ids), 0, len(ids) - 1)
+        known = ids[idx] == player_ids
+        players, idx = players[known], idx[known]
+
+        self.columns["team"][players] = teams[idx]
+        # Sized for both, a clip may hold only one of the teams the colors were fitted for
+        color_lut = np.zeros((max(max(team_colors, default=0), int(teams.max())) + 1, 3), dtype=np.float32)
+        for team, color in team_colors.items():
+            color_lut[team] = color
+        self.columns["team_color"][players] = color_lut[teams[idx]]
+        self.fields.add("team")
+
+    def set_has_ball(self, assigned_player_per_frame):
+        # assigned_player_per_frame holds one player track id per frame, -1 when nobody has the ball
+        assigned = np.asarray(assigned_player_per_frame, dtype=np.int64)
+        players = self.class_mask("players")
+        self.columns["has_ball"] = players & (self.columns["track_id"] == assigned[self.columns["frame"]])
+        self.fields.add("has_ball")
+
+    def frame_dict(self, cls_idx, frame_num):
+        idx = frame_num * len(OBJECT_CLASSES) + cls_idx
+        start, stop = self.offsets[idx], self.offsets[idx + 1]
+        columns = self.columns
+        frame_tracks = {}
+        for row in range(start, stop):
+            track_info = {"box": columns["box"][row].tolist()}
+            if "position" in self.fields:
+                track_info["position"] = tuple(columns["position"][row].tolist())
+            if "position_adjusted" in self.fields:
+                track_info["position_adjusted"] = tuple(columns["position_adjusted"][row].tolist())
+            if "team" in self.fields and columns["team"][row] > 0:
+                track_info["team"] = int(columns["team"][row])
+                track_info["team_color"] = tuple(columns["team_color"][row].tolist())
+            if "has_ball" in self.fields and columns["has_ball"][row]:
+                track_info["has_ball"] = True
+            if "position_transformed" in self.fields and np.isfinite(columns["position_transformed"][row]).all():
+                track_info["position_transformed"] = tuple(columns["position_transformed"][row].tolist())
+            # Gated separately: an outlier speed is dropped while the distance covered stays known
+            if "speed" in self.fields and np.isfinite(columns["speed"][row]):
+                track_info["speed"] = float(columns["speed"][row])
+            if "distance" in self.fields and np.isfinite(columns["distance"][row]):
+                track_info["distance"] = float(columns["distance"][row])
+            frame_tracks[int(columns["track_id"][row])] = track_info
+        return frame_tracks
+
+    def to_tracks(self):
+        return {
+            object_name: [self.frame_dict(cls_idx, frame_num) for frame_num in range(self.num_frames)]
+            for cls_idx, object_name in enumerate(OBJECT_CLASSES)
+        }
+
+
+class TrackTableObjectView:
+    # Read-only list-like view of one object class; each frame is materialized as a dict on access
+    def __init__(self, table, cls_idx):
+        self.table = table
+        self.cls_idx = cls_idx
+
+    def __len__(self):
+        return self.table.num_frames
+
+    def __getitem__(self, frame_num):
+        if frame_num < 0:
+            frame_num += self.table.num_frames
+        if not 0 <= frame_num < self.table.num_frames:
+            raise IndexError(frame_num)
+        return self.table.frame_dict(self.cls_idx, frame_num)
+
+    def __iter__(self):
+        for frame_num in range(self.table.num_frames):
+            yield self.table.frame_dict(self.cls_idx, frame_num)
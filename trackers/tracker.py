@@ -1,22 +1,65 @@
-from ultralytics import YOLO
-import supervision as sv
-import pickle
+import itertools
+import time
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-import cv2 as cv
-import pandas as pd
-import os
 import sys
 
 sys.path.append("../")
-from utils import get_box_width, get_center_of_box, get_foot_position
+from utils import get_center_of_box, get_foot_position, batched, read_stub, save_stub, box_iou_matrix, frame_context
+from utils import draw_ellipse, draw_triangle, draw_team_ball_control_panel
+from player_ball_assigner import PossessionStats
+from camera_movement_estimator import CameraMovementEstimator
+from profiler import NULL_PROFILER
+from .track_table import TrackTable
+from .detector_backends import create_backend, AdaptiveBatchSizer
+from .ball_trajectory import BallCandidateSelector, interpolate_ball_boxes, BALL_MAX_GAP
+
+
+# Bump when the layout or semantics of cached detections/tracks change
+DETECTIONS_CACHE_VERSION = 1
+TRACKS_CACHE_VERSION = 2
 
 
 class Tracker:
-    def __init__(self, model_path):
-        self.model = YOLO(model_path)
-        self.tracker = sv.ByteTrack()
+    def __init__(self, model_path, keyframe_interval=None, motion_threshold=15.0, min_tracked_fraction=0.3,
+                 backend=None, batch_size=None, profiler=None):
+        self.model_path = model_path
+        # "ultralytics", "onnxruntime" or a backend instance; picked from the model file extension by default.
+        # The backend (and with it the model weights) and ByteTrack are only created once frames need them,
+        # so runs served from stubs or the stage cache never import the detector stack.
+        self.backend_name = backend
+        self._backend = None
+        self.conf = 0.1
+        self.tracker_params = {}
+        self._byte_tracker = None
+        # A fixed batch_size disables adaptive batching
+        self.batch_sizer = AdaptiveBatchSizer() if batch_size is None else None
+        self.fixed_batch_size = batch_size
+        self.class_names = {}
+        self.profiler = profiler or NULL_PROFILER
+        # One ball per frame, chosen among all ball detections by confidence and continuity
+        self.ball_selector = BallCandidateSelector()
+
+        # Keyframe mode: the detector runs every keyframe_interval frames, or earlier when the scene moves
+        # more than motion_threshold pixels between frames or fewer than min_tracked_fraction of the flow
+        # points stay tracked. Boxes on the other frames are propagated with LK optical flow.
+        self.keyframe_params = None
+        if keyframe_interval is not None:
+            self.keyframe_params = {
+                "interval": keyframe_interval,
+                "motion_threshold": motion_threshold,
+                "min_tracked_fraction": min_tracked_fraction,
+            }
+        self.detector_calls = 0
+        self.reset_keyframe_state()
+        # PossessionStats of the last raw team_ball_control array drawn per frame
+        self._possession_source = None
+        self._possession_stats = None
 
     def add_position_to_tracks(self, tracks):
+        if isinstance(tracks, TrackTable):
+            tracks.add_positions()
+            return
         for object, object_tracks in tracks.items():
             for frame_num, track in enumerate(object_tracks):
                 # Create a copy of track items for safe iteration
@@ -29,167 +72,346 @@ class Tracker:
                         position = get_foot_position(box)
                     tracks[object][frame_num][track_id]["position"] = position
 
-    def get_object_tracks(self, frames, read_from_stub=False, stub_path=None):
-        if read_from_stub and stub_path and os.path.exists(stub_path):
-            with open(stub_path, "rb") as file:
-                tracks = pickle.load(file)
+    def get_object_tracks(self, frames, read_from_stub=False, stub_path=None,
+                          cache=None, video_path=None, frame_range=None):
+        tracks = read_stub(read_from_stub, stub_path)
+        if tracks is not None:
             return tracks
 
-        detections = self.detect_frames(frames)
+        # With a StageCache, results are keyed on the video content, the model file and the parameters,
+        # so re-runs skip detection (and tracking) unless one of them changed
+        use_cache = cache is not None and video_path is not None
+        detections = None
+        if use_cache:
+            tracks = self.load_cached_tracks(cache, video_path, frame_range)
+            if tracks is not None:
+                return tracks
+            detections = self.load_cached_detections(cache, video_path, frame_range)
 
-        tracks = {"players": [], "referees": [], "ball": []}
+        detected = detections is None
+        if detected:
+            detections = self.detect_frames(frames)
 
-        for frame_num, detection in enumerate(detections):
-            cls_names = detection.names
-            cls_names_inv = {value: key for key, value in cls_names.items()}
+        tracks = {"players": [], "referees": [], "ball": []}
+        frame_detections = []
 
-            print(f"Frame {frame_num}: Detected classes: {list(cls_names.values())}")
+        for detection in detections:
+            if use_cache and detected:
+                frame_detections.append(detection)
+            self.update_tracks(tracks, detection)
 
-            detection_supervision = sv.Detections.from_ultralytics(detection)
+        save_stub(stub_path, tracks)
+        if use_cache:
+            self.save_cached_tracks(cache, video_path, tracks, frame_detections if detected else None, frame_range)
 
-            for object_idx, class_id in enumerate(detection_supervision.class_id):
-                if cls_names.get(class_id) == "goalkeeper":
-                    detection_supervision.class_id[object_idx] = cls_names_inv.get("player", None)
+        return tracks
 
+    def cache_keys(self, cache, video_path):
+        video_hash = cache.file_hash(video_path)
+        detections_key = cache.key("detections", version=DETECTIONS_CACHE_VERSION, video=video_hash,
+                                   model=cache.file_hash(self.model_path), conf=self.conf,
+                                   keyframes=self.keyframe_params)
+        tracks_key = cache.key("tracks", version=TRACKS_CACHE_VERSION, detections=detections_key,
+                               tracker=self.tracker_params)
+        return detections_key, tracks_key
+
+    def load_cached_tracks(self, cache, video_path, frame_range=None):
+        start, stop = frame_range or (0, None)
+        _, tracks_key = self.cache_keys(cache, video_path)
+        entry = cache.load("tracks", tracks_key, start, stop)
+        if entry is None:
+            return None
+        frames = entry.frame_slice(start, stop)
+        return TrackTable.from_arrays(entry.arrays).slice_frames(frames.start, frames.stop).to_tracks()
+
+    def load_cached_detections(self, cache, video_path, frame_range=None):
+        start, stop = frame_range or (0, None)
+        detections_key, _ = self.cache_keys(cache, video_path)
+        entry = cache.load("detections", detections_key, start, stop)
+        if entry is None:
+            return None
+        frames = entry.frame_slice(start, stop)
+        num_frames = entry.stop - entry.start
+        return self.detections_from_arrays(entry.arrays, frames.start, num_frames if frames.stop is None else frames.stop)
+
+    def save_cached_tracks(self, cache, video_path, tracks, detections=None, frame_range=None):
+        start, stop = frame_range or (0, None)
+        num_frames = len(tracks["players"])
+        detections_key, tracks_key = self.cache_keys(cache, video_path)
+        if detections is not None:
+            cache.save("detections", detections_key, self.detections_to_arrays(detections),
+                       start, stop, num_frames=num_frames)
+        cache.save("tracks", tracks_key, TrackTable.from_tracks(tracks).to_arrays(),
+                   start, stop, num_frames=num_frames)
+
+    def detections_to_arrays(self, detections):
+        frames = np.concatenate([np.full(len(detection), frame_num, dtype=np.int32)
+                                 for frame_num, detection in enumerate(detections)] + [np.zeros(0, dtype=np.int32)])
+        xyxy = np.concatenate([detection.xyxy for detection in detections] + [np.zeros((0, 4))]).astype(np.float32)
+        confidence = np.concatenate([detection.confidence for detection in detections] + [np.zeros(0)]).astype(np.float32)
+        class_id = np.concatenate([detection.class_id for detection in detections] + [np.zeros(0)]).astype(np.int32)
+        class_names = [self.class_names.get(idx, "") for idx in range(max(self.class_names, default=-1) + 1)]
+        return {"frame": frames, "xyxy": xyxy, "confidence": confidence, "class_id": class_id,
+                "class_names": np.array(class_names, dtype=str)}
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            self._backend = create_backend(self.model_path, self.backend_name)
+        return self._backend
+
+    @property
+    def tracker(self):
+        if self._byte_tracker is None:
+            import supervision as sv
+            self._byte_tracker = sv.ByteTrack(**self.tracker_params)
+        return self._byte_tracker
+
+    @tracker.setter
+    def tracker(self, byte_tracker):
+        self._byte_tracker = byte_tracker
+
+    def detections_from_arrays(self, arrays, start, stop):
+        import supervision as sv
+        self.class_names = {idx: str(name) for idx, name in enumerate(arrays["class_names"])}
+        offsets = np.searchsorted(arrays["frame"], np.arange(start, stop + 1))
+        for frame_num in range(stop - start):
+            rows = slice(offsets[frame_num], offsets[frame_num + 1])
+            yield sv.Detections(
+                xyxy=np.array(arrays["xyxy"][rows]),
+                confidence=np.array(arrays["confidence"][rows]),
+                class_id=np.array(arrays["class_id"][rows]),
+            )
+
+    def update_tracks(self, tracks, detection_supervision):
+        # Appends the tracks of a single detected frame, so frames can be fed in one batch at a time
+        frame_num = len(tracks["players"])
+        cls_names = self.class_names
+        cls_names_inv = {value: key for key, value in cls_names.items()}
+
+        for object_idx, class_id in enumerate(detection_supervision.class_id):
+            if cls_names.get(class_id) == "goalkeeper":
+                detection_supervision.class_id[object_idx] = cls_names_inv.get("player", None)
+
+        with self.profiler.stage("track"):
             detections_with_tracks = self.tracker.update_with_detections(detection_supervision)
 
-            tracks["players"].append({})
-            tracks["referees"].append({})
-            tracks["ball"].append({})
+        tracks["players"].append({})
+        tracks["referees"].append({})
+        tracks["ball"].append({})
 
-            for frame_detection in detections_with_tracks:
-                box = frame_detection[0].tolist()
-                cls_id = frame_detection[3]
-                track_id = frame_detection[4]
+        for frame_detection in detections_with_tracks:
+            box = frame_detection[0].tolist()
+            cls_id = frame_detection[3]
+            track_id = frame_detection[4]
 
-                if cls_id == cls_names_inv.get("player", None):
-                    tracks["players"][frame_num][track_id] = {"box": box}
+            if cls_id == cls_names_inv.get("player", None):
+                tracks["players"][frame_num][track_id] = {"box": box}
 
-                if cls_id == cls_names_inv.get("referee", None):
-                    tracks["referees"][frame_num][track_id] = {"box": box}
+            if cls_id == cls_names_inv.get("referee", None):
+                tracks["referees"][frame_num][track_id] = {"box": box}
 
-            for frame_detection in detection_supervision:
-                box = frame_detection[0].tolist()
-                cls_id = frame_detection[3]
-                if cls_id == cls_names_inv.get("ball", None):
-                    tracks["ball"][frame_num][1] = {"box": box}
-
-        if stub_path:
-            with open(stub_path, "wb") as file:
-                pickle.dump(tracks, file)
+        ball_detections = detection_supervision[detection_supervision.class_id == cls_names_inv.get("ball", -1)]
+        best = self.ball_selector.select(ball_detections.xyxy, ball_detections.confidence)
+        if best is not None:
+            tracks["ball"][frame_num][1] = {"box": ball_detections.xyxy[best].tolist()}
 
         return tracks
 
+    @property
+    def batch_size(self):
+        return self.fixed_batch_size or self.batch_sizer.batch_size
+
     def detect_frames(self, frames):
-        batch_size = 20
-        detections = []
-        for i in range(0, len(frames), batch_size):
-            detections += self.model.predict(frames[i:i + batch_size], conf=0.1)
+        if self.keyframe_params is not None:
+            for batch in batched(frames, lambda: self.batch_size):
+                yield from self.detect_batch(batch)
+            return
+
+        # Reading and preprocessing the next batch runs on a helper thread while the current one is inferred
+        frames = iter(frames)
+
+        def prepare():
+            batch = list(itertools.islice(frames, self.batch_size))
+            if not batch:
+                return batch, None
+            with self.profiler.stage("preprocess", len(batch)):
+                return batch, self.backend.preprocess(batch)
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            next_batch = executor.submit(prepare)
+            while True:
+                batch, prepared = next_batch.result()
+                if not batch:
+                    return
+                next_batch = executor.submit(prepare)
+                yield from self.infer(batch, prepared)
+
+    def detect_batch(self, frames):
+        if self.keyframe_params is None:
+            return self.predict(frames)
+        return [self.detect_adaptive(frame, lambda frame: self.predict([frame])[0]) for frame in frames]
+
+    def predict(self, frames):
+        with self.profiler.stage("preprocess", len(frames)):
+            prepared = self.backend.preprocess(frames)
+        return self.infer(frames, prepared)
+
+    def infer(self, frames, prepared):
+        start = time.perf_counter()
+        with self.profiler.stage("detect", len(frames)):
+            detections = self.backend.infer(prepared, self.conf)
+        if self.batch_sizer is not None:
+            self.batch_sizer.record(len(frames), time.perf_counter() - start, frames[0])
+        self.class_names = self.backend.names
+        self.detector_calls += len(frames)
         return detections
 
-    def draw_ellipse(self, frame, box, color, track_id=None, draw_track_id=True):
-        y2 = int(box[3])  # Bottom of the bounding box
-        x_center, _ = get_center_of_box(box)
-        width = get_box_width(box)
-
-        # Draw ellipse
-        cv.ellipse(
-            frame,
-            center=(x_center, y2),
-            axes=(int(width), int(0.35 * width)),
-            angle=0,
-            startAngle=-45,
-            endAngle=235,
-            color=color,
-            thickness=2,
-            lineType=cv.LINE_4,
-        )
-
-        if not draw_track_id or track_id is None:
-            return frame
-
-        # Draw rectangle for track ID
-        rectangle_width = 40
-        rectangle_height = 20
-        x1_rect = x_center - rectangle_width // 2
-        x2_rect = x_center + rectangle_width // 2
-        y1_rect = y2 - rectangle_height // 2 + 15
-        y2_rect = y2 + rectangle_height // 2 + 15
-
-        cv.rectangle(frame, (int(x1_rect), int(y1_rect)), (int(x2_rect), int(y2_rect)), color, cv.FILLED)
-
-        x1_text = x1_rect + 12
-        if track_id > 99:
-            x1_text -= 10
-
-        cv.putText(
-            frame,
-            f"{track_id}",
-            (int(x1_text), int(y1_rect + 15)),
-            cv.FONT_HERSHEY_SIMPLEX,
-            0.6,
-            (0, 0, 0),
-            2,
-        )
+    def reset_tracking(self):
+        # Fresh ByteTrack and keyframe state, e.g. before tracking an unrelated video segment
+        self._byte_tracker = None
+        self.ball_selector.reset()
+        self.reset_keyframe_state()
+
+    def reset_keyframe_state(self):
+        self._box_propagator = None
+        self._last_gray = None
+        self._last_detection = None
+        self._frames_since_keyframe = 0
+
+    def detect_adaptive(self, frame, detect):
+        # Runs detect(frame) on keyframes and propagates the previous frame's boxes otherwise
+        import supervision as sv
+        params = self.keyframe_params
+        gray = frame_context(frame).gray()
+        if self._box_propagator is None:
+            self._box_propagator = CameraMovementEstimator(frame)
+
+        is_keyframe = self._last_detection is None or self._frames_since_keyframe + 1 >= params["interval"]
+        if not is_keyframe:
+            with self.profiler.stage("propagate"):
+                boxes, tracked_fraction, scene_motion = self._box_propagator.propagate_boxes(
+                    self._last_gray, gray, self._last_detection.xyxy
+                )
+            uncertain = len(tracked_fraction) > 0 and tracked_fraction.mean() < params["min_tracked_fraction"]
+            is_keyframe = uncertain or np.hypot(*scene_motion) > params["motion_threshold"]
+
+        if is_keyframe:
+            detection = detect(frame)
+            self._frames_since_keyframe = 0
+        else:
+            detection = sv.Detections(
+                xyxy=boxes,
+                confidence=None if self._last_detection.confidence is None else self._last_detection.confidence.copy(),
+                class_id=self._last_detection.class_id.copy(),
+            )
+            self._frames_since_keyframe += 1
+
+        self._last_gray = gray
+        self._last_detection = detection
+        return detection
+
+    def evaluate_keyframe_detection(self, frames, iou_threshold=0.5):
+        # Compares keyframe mode against running the detector on every frame. The keyframes reuse the
+        # baseline detections, so the model only runs once per frame.
+        frames = list(frames)
+        baseline = []
+        for batch in batched(frames, lambda: self.batch_size):
+            baseline += self.predict(batch)
+
+        self.reset_keyframe_state()
+        keyframes = []
+        adaptive = []
+        for frame_num, frame in enumerate(frames):
+            def detect(_, frame_num=frame_num):
+                keyframes.append(frame_num)
+                return baseline[frame_num]
+            adaptive.append(self.detect_adaptive(frame, detect))
+        self.reset_keyframe_state()
+
+        ious, matched_baseline, matched_adaptive = [], 0, 0
+        num_baseline = sum(len(detection) for detection in baseline)
+        num_adaptive = sum(len(detection) for detection in adaptive)
+        for expected, predicted in zip(baseline, adaptive):
+            if len(expected) == 0 or len(predicted) == 0:
+                continue
+            iou = box_iou_matrix(expected.xyxy, predicted.xyxy)
+            iou[expected.class_id[:, None] != predicted.class_id[None, :]] = 0
+            best = iou.max(axis=1)
+            ious.append(best)
+            matched_baseline += int((best >= iou_threshold).sum())
+            matched_adaptive += int((iou.max(axis=0) >= iou_threshold).sum())
+
+        return {
+            "frames": len(frames),
+            "detector_calls": len(keyframes),
+            "detector_call_reduction": len(frames) / max(len(keyframes), 1),
+            "mean_iou": float(np.concatenate(ious).mean()) if ious else 0.0,
+            "recall": matched_baseline / num_baseline if num_baseline else 1.0,
+            "precision": matched_adaptive / num_adaptive if num_adaptive else 1.0,
+        }
 
-        return frame
+    def draw_ellipse(self, frame, box, color, track_id=None, draw_track_id=True):
+        return draw_ellipse(frame, box, color, track_id, draw_track_id)
 
     def draw_triangle(self, frame, box, color):
-        y = int(box[1])
-        x, _ = get_center_of_box(box)
-        triangle_points = np.array([
-            [x, y],
-            [x - 10, y - 20],
-            [x + 10, y - 20]
-        ])
-        cv.drawContours(frame, [triangle_points], 0, color, -1)
-        cv.drawContours(frame, [triangle_points], 0, (0, 0, 0), 2)
-        return frame
-
-    def interpolate_ball_positions(self, ball_positions):
-        ball_positions = [x.get(1, {}).get("box", []) for x in ball_positions]
-        df_ball_positions = pd.DataFrame(ball_positions, columns=["x1", "y1", "x2", "y2"])
-        df_ball_positions = df_ball_positions.interpolate().bfill()
-        return [{1: {"box": x}} for x in df_ball_positions.to_numpy().tolist()]
+        return draw_triangle(frame, box, color)
+
+    @staticmethod
+    def interpolate_ball_positions(ball_positions, max_gap=BALL_MAX_GAP, method="linear"):
+        boxes = np.full((len(ball_positions), 4), np.nan)
+        for frame_num, ball in enumerate(ball_positions):
+            box = ball.get(1, {}).get("box")
+            if box is not None and len(box) == 4:
+                boxes[frame_num] = box
+        boxes = interpolate_ball_boxes(boxes, max_gap, method)
+        return [{} if np.isnan(box).any() else {1: {"box": box}} for box in boxes.tolist()]
+
+    def possession_stats(self, team_ball_control, frame_num):
+        # A raw array is wrapped once and reused while the same array is passed; frames appended to it
+        # since the last call are added incrementally, so drawing a whole video stays linear
+        if self._possession_source is not team_ball_control or self._possession_stats.num_frames > len(team_ball_control):
+            self._possession_source = team_ball_control
+            self._possession_stats = PossessionStats()
+        stats = self._possession_stats
+        for team in team_ball_control[stats.num_frames:frame_num + 1]:
+            stats.update(team)
+        return stats
 
     def draw_team_ball_control(self, frame, frame_num, team_ball_control):
-        overlay = frame.copy()
-        cv.rectangle(overlay, (1350, 850), (1900, 970), (255, 255, 255), -1)
-        alpha = 0.4
-        cv.addWeighted(overlay, alpha, frame, 1 - alpha, 0, frame)
+        # Pass a PossessionStats built once for the whole video, or the same raw array on every call
+        if not isinstance(team_ball_control, PossessionStats):
+            team_ball_control = self.possession_stats(team_ball_control, frame_num)
+
+        team_1, team_2 = team_ball_control.percentages(frame_num)
+        return draw_team_ball_control_panel(frame, team_1, team_2)
+
+    def draw_frame_annotations(self, frame, frame_num, tracks, team_ball_control):
+        player_dict = tracks["players"][frame_num]
+        ball_dict = tracks["ball"][frame_num]
+        referee_dict = tracks["referees"][frame_num]
+
+        for track_id, player in player_dict.items():
+            color = player.get("team_color", (0, 0, 255))
+            frame = self.draw_ellipse(frame, player["box"], color, track_id, draw_track_id=True)
+            if player.get("has_ball", False):
+                frame = self.draw_triangle(frame, player["box"], (0, 0, 255))
 
-        team_ball_control_till_frame = team_ball_control[:frame_num + 1]
-        team_1_num_frame = team_ball_control_till_frame[team_ball_control_till_frame == 1].shape[0]
-        team_2_num_frame = team_ball_control_till_frame[team_ball_control_till_frame == 2].shape[0]
+        for _, referee in referee_dict.items():
+            frame = self.draw_ellipse(frame, referee["box"], (0, 255, 255), draw_track_id=False)
 
-        team_1 = team_1_num_frame / (team_1_num_frame + team_2_num_frame)
-        team_2 = team_2_num_frame / (team_1_num_frame + team_2_num_frame)
+        for track_id, ball in ball_dict.items():
+            frame = self.draw_triangle(frame, ball["box"], (0, 255, 0))
 
-        cv.putText(frame, f"Team 1 Ball Control: {team_1 * 100:.2f}%", (1400, 900), cv.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 0), 3)
-        cv.putText(frame, f"Team 2 Ball Control: {team_2 * 100:.2f}%", (1400, 950), cv.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 0), 3)
+        frame = self.draw_team_ball_control(frame, frame_num, team_ball_control)
         return frame
 
     def draw_annotations(self, input_video_frames, tracks, team_ball_control):
+        if not isinstance(team_ball_control, PossessionStats):
+            team_ball_control = PossessionStats(team_ball_control)
         output_video_frames = []
         for frame_num, frame in enumerate(input_video_frames):
-            frame = frame.copy()
-            player_dict = tracks["players"][frame_num]
-            ball_dict = tracks["ball"][frame_num]
-            referee_dict = tracks["referees"][frame_num]
-
-            for track_id, player in player_dict.items():
-                color = player.get("team_color", (0, 0, 255))
-                frame = self.draw_ellipse(frame, player["box"], color, track_id, draw_track_id=True)
-                if player.get("has_ball", False):
-                    frame = self.draw_triangle(frame, player["box"], (0, 0, 255))
-
-            for _, referee in referee_dict.items():
-                frame = self.draw_ellipse(frame, referee["box"], (0, 255, 255), draw_track_id=False)
-
-            for track_id, ball in ball_dict.items():
-                frame = self.draw_triangle(frame, ball["box"], (0, 255, 0))
-
-            frame = self.draw_team_ball_control(frame, frame_num, team_ball_control)
+            frame = self.draw_frame_annotations(frame.copy(), frame_num, tracks, team_ball_control)
             output_video_frames.append(frame)
 
         return output_video_frames
@@ -1,2 +1,6 @@
-from .video_utils import save_video, read_video
-from .box_utils import get_box_width, get_center_of_box, measure_distance, measure_xy_distance, get_foot_position
\ No newline at end of file
+from .video_utils import save_video, read_video, iter_video, get_video_properties, batched, BackgroundVideoWriter
+from .box_utils import get_box_width, get_center_of_box, measure_distance, measure_xy_distance, get_foot_position, box_iou_matrix
+from .stub_utils import read_stub, save_stub
+from .frame_context import FrameContext, frame_context, as_frame
+from .process_utils import worker_state, init_worker_state, write_json_atomic
+from .draw_utils import blend_rectangle, draw_ellipse, draw_triangle, draw_speed_and_distance, draw_team_ball_control_panel, draw_camera_movement_panel
@@ -1,3 +1,5 @@
+import numpy as np
+
 def get_center_of_box(box):
     x1, y1, x2, y2 = box
     return int((x1 + x2) / 2), int((y1 + y2) / 2)
@@ -14,4 +16,15 @@ def measure_xy_distance(p1, p2):
 
 def get_foot_position(box):
     x1, y1, x2, y2 = box
-    return int((x1 + x2) / 2), int(y2)
\ No newline at end of file
+    return int((x1 + x2) / 2), int(y2)
+
+def box_iou_matrix(boxes_a, boxes_b):
+    boxes_a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)
+    boxes_b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)
+    top_left = np.maximum(boxes_a[:, None, :2], boxes_b[None, :, :2])
+    bottom_right = np.minimum(boxes_a[:, None, 2:], boxes_b[None, :, 2:])
+    intersection = np.prod(np.clip(bottom_right - top_left, 0, None), axis=-1)
+    area_a = np.prod(boxes_a[:, 2:] - boxes_a[:, :2], axis=-1)
+    area_b = np.prod(boxes_b[:, 2:] - boxes_b[:, :2], axis=-1)
+    union = area_a[:, None] + area_b[None, :] - intersection
+    return np.divide(intersection, union, out=np.zeros_like(intersection), where=union > 0)
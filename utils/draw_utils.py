@@ -0,0 +1,97 @@
+import cv2 as cv
+import numpy as np
+from .box_utils import get_box_width, get_center_of_box
+
+def blend_rectangle(frame, top_left, bottom_right, color, alpha):
+    # Same result as drawing the filled rectangle on a full-frame copy and addWeighted-ing it back,
+    # but only the rectangle's ROI is touched and no frame-sized buffer is allocated
+    x1, y1 = max(top_left[0], 0), max(top_left[1], 0)
+    x2, y2 = min(bottom_right[0] + 1, frame.shape[1]), min(bottom_right[1] + 1, frame.shape[0])
+    if x1 >= x2 or y1 >= y2:
+        return frame
+    roi = frame[y1:y2, x1:x2]
+    color_block = np.empty_like(roi)
+    color_block[:] = color
+    frame[y1:y2, x1:x2] = cv.addWeighted(color_block, alpha, roi, 1 - alpha, 0)
+    return frame
+
+def draw_ellipse(frame, box, color, track_id=None, draw_track_id=True):
+    y2 = int(box[3])  # Bottom of the bounding box
+    x_center, _ = get_center_of_box(box)
+    width = get_box_width(box)
+
+    # Draw ellipse
+    cv.ellipse(
+        frame,
+        center=(x_center, y2),
+        axes=(int(width), int(0.35 * width)),
+        angle=0,
+        startAngle=-45,
+        endAngle=235,
+        color=color,
+        thickness=2,
+        lineType=cv.LINE_4,
+    )
+
+    if not draw_track_id or track_id is None:
+        return frame
+
+    # Draw rectangle for track ID
+    rectangle_width = 40
+    rectangle_height = 20
+    x1_rect = x_center - rectangle_width // 2
+    x2_rect = x_center + rectangle_width // 2
+    y1_rect = y2 - rectangle_height // 2 + 15
+    y2_rect = y2 + rectangle_height // 2 + 15
+
+    cv.rectangle(frame, (int(x1_rect), int(y1_rect)), (int(x2_rect), int(y2_rect)), color, cv.FILLED)
+
+    x1_text = x1_rect + 12
+    if track_id > 99:
+        x1_text -= 10
+
+    cv.putText(
+        frame,
+        f"{track_id}",
+        (int(x1_text), int(y1_rect + 15)),
+        cv.FONT_HERSHEY_SIMPLEX,
+        0.6,
+        (0, 0, 0),
+        2,
+    )
+
+    return frame
+
+def draw_triangle(frame, box, color):
+    y = int(box[1])
+    x, _ = get_center_of_box(box)
+    triangle_points = np.array([
+        [x, y],
+        [x - 10, y - 20],
+        [x + 10, y - 20]
+    ])
+    cv.drawContours(frame, [triangle_points], 0, color, -1)
+    cv.drawContours(frame, [triangle_points], 0, (0, 0, 0), 2)
+    return frame
+
+def draw_speed_and_distance(frame, box, speed, distance):
+    # Below the track ID box under the player's feet; speed is None on frames where it was dropped
+    x_center, _ = get_center_of_box(box)
+    y = int(box[3]) + 45
+    if speed is not None:
+        cv.putText(frame, f"{speed:.1f} km/h", (x_center - 40, y), cv.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 2)
+    cv.putText(frame, f"{distance:.1f} m", (x_center - 40, y + 20), cv.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 2)
+    return frame
+
+def draw_team_ball_control_panel(frame, team_1, team_2):
+    blend_rectangle(frame, (1350, 850), (1900, 970), (255, 255, 255), 0.4)
+    cv.putText(frame, f"Team 1 Ball Control: {team_1 * 100:.2f}%", (1400, 900), cv.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 0), 3)
+    cv.putText(frame, f"Team 2 Ball Control: {team_2 * 100:.2f}%", (1400, 950), cv.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 0), 3)
+    return frame
+
+def draw_camera_movement_panel(frame, camera_movement):
+    blend_rectangle(frame, (0, 0), (500, 100), (255, 255, 255), 0.6)
+    x_movement, y_movement = camera_movement
+    cv.putText(frame, f"Camera Movement X: {x_movement:.2f}", (10, 30), cv.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 0), 3)
+    cv.putText(frame, f"Camera Movement Y: {y_movement:.2f}", (10, 60), cv.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 0), 3)
+    return frame
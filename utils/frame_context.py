@@ -0,0 +1,51 @@
+import cv2 as cv
+
+
+class FrameContext:
+    # One decoded frame plus the representations stages derive from it (grayscale, resized copies,
+    # letterboxed detector input, per-track crop colors). Each is computed on first use and then shared,
+    # so a frame is converted to gray once even when the camera movement estimator and the keyframe
+    # box propagation both need it.
+    def __init__(self, frame, frame_num=None):
+        self.frame = frame
+        self.frame_num = frame_num
+        self._derived = {}
+
+    @property
+    def shape(self):
+        return self.frame.shape
+
+    @property
+    def nbytes(self):
+        return self.frame.nbytes
+
+    def __contains__(self, key):
+        return key in self._derived
+
+    def get(self, key, default=None):
+        return self._derived.get(key, default)
+
+    def put(self, key, value):
+        self._derived[key] = value
+        return value
+
+    def derived(self, key, compute):
+        if key in self._derived:
+            return self._derived[key]
+        return self.put(key, compute())
+
+    def gray(self, size=None):
+        # size is (width, height) of a downscaled grayscale copy
+        if size is None:
+            return self.derived("gray", lambda: cv.cvtColor(self.frame, cv.COLOR_BGR2GRAY))
+        return self.derived(("gray", tuple(size)),
+                            lambda: cv.resize(self.gray(), tuple(size), interpolation=cv.INTER_AREA))
+
+
+def frame_context(frame):
+    return frame if isinstance(frame, FrameContext) else FrameContext(frame)
+
+
+def as_frame(frame):
+    return frame.frame if isinstance(frame, FrameContext) else frame
+
@@ -0,0 +1,26 @@
+import json
+import os
+import uuid
+
+# Per-process state of pool workers: filled once by the pool initializer and reused by every task the
+# worker is given, so e.g. the detector is loaded once per process
+worker_state = {}
+
+
+def init_worker_state(builders):
+    # Pool initializer; builders maps a name to (factory, args, kwargs), or to None for an absent entry
+    for name, builder in builders.items():
+        if builder is None:
+            worker_state[name] = None
+            continue
+        factory, args, kwargs = builder
+        worker_state[name] = factory(*args, **kwargs)
+
+
+def write_json_atomic(path, data, indent=None):
+    # Written to a uniquely named temporary file first, so a crash or a concurrent writer never leaves
+    # a half-written file behind
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "w") as file:
+        json.dump(data, file, indent=indent)
+    os.replace(tmp_path, path)
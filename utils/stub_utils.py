@@ -0,0 +1,13 @@
+import os
+import pickle
+
+def read_stub(read_from_stub, stub_path):
+    if read_from_stub and stub_path is not None and os.path.exists(stub_path):
+        with open(stub_path, "rb") as file:
+            return pickle.load(file)
+    return None
+
+def save_stub(stub_path, data):
+    if stub_path is not None:
+        with open(stub_path, "wb") as file:
+            pickle.dump(data, file)
@@ -1,19 +1,134 @@
+import itertools
+import os
+import queue
+import sys
+import threading
 import cv2 as cv
+sys.path.append("../")
+from profiler import NULL_PROFILER
+
+def iter_video(video_path, start=0, stop=None):
+    # Decode frames lazily so only the frames currently in use are held in memory
+    cap = cv.VideoCapture(video_path)
+    if start:
+        cap.set(cv.CAP_PROP_POS_FRAMES, start)
+    frame_num = start
+    try:
+        while cap.isOpened() and (stop is None or frame_num < stop):
+            ret, frame = cap.read()
+            if not ret:
+                break
+            yield frame
+            frame_num += 1
+    finally:
+        cap.release()
 
 def read_video(video_path):
+    return list(iter_video(video_path))
+
+def get_video_properties(video_path):
     cap = cv.VideoCapture(video_path)
-    frames = []
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
-            break
-        frames.append(frame)
+    properties = {
+        "fps": cap.get(cv.CAP_PROP_FPS) or 24.0,
+        "width": int(cap.get(cv.CAP_PROP_FRAME_WIDTH)),
+        "height": int(cap.get(cv.CAP_PROP_FRAME_HEIGHT)),
+        "frame_count": int(cap.get(cv.CAP_PROP_FRAME_COUNT)),
+    }
     cap.release()
-    return frames
-
-def save_video(frames, video_path):
-    fourcc = cv.VideoWriter_fourcc(*"XVID")
-    out = cv.VideoWriter(video_path, fourcc, 24.0, (frames[0].shape[1], frames[0].shape[0]))
-    for frame in frames:
-        out.write(frame)
-    out.release()
\ No newline at end of file
+    return properties
+
+def batched(iterable, batch_size):
+    # batch_size may be a callable, read again for every batch so an adaptive size takes effect
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, batch_size() if callable(batch_size) else batch_size))
+        if not batch:
+            return
+        yield batch
+
+# Default fourcc per output container when no codec is given
+CONTAINER_CODECS = {
+    ".avi": "XVID",
+    ".mp4": "mp4v",
+    ".m4v": "mp4v",
+    ".mov": "mp4v",
+    ".mkv": "XVID",
+}
+
+class BackgroundVideoWriter:
+    # Encodes frames on a background thread fed by a bounded queue, so encoding overlaps with
+    # rendering. preview_scale and frame_stride give a fast reduced preview of the output.
+    def __init__(self, video_path, fps=24.0, codec=None, queue_size=32, preview_scale=1.0, frame_stride=1,
+                 profiler=None):
+        self.video_path = video_path
+        self.codec = codec or CONTAINER_CODECS.get(os.path.splitext(video_path)[1].lower(), "XVID")
+        self.frame_stride = max(int(frame_stride), 1)
+        self.fps = fps / self.frame_stride
+        self.preview_scale = preview_scale
+        self.profiler = profiler or NULL_PROFILER
+        self.frames_written = 0
+        self._frame_num = 0
+        self._error = None
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _open(self, frame):
+        height, width = frame.shape[:2]
+        fourcc = cv.VideoWriter_fourcc(*self.codec)
+        writer = cv.VideoWriter(self.video_path, fourcc, self.fps, (width, height))
+        if not writer.isOpened():
+            raise IOError(f"Could not open {self.video_path} for writing with codec {self.codec}")
+        return writer
+
+    def _run(self):
+        writer = None
+        try:
+            while True:
+                frame = self._queue.get()
+                if frame is None:
+                    break
+                with self.profiler.stage("encode"):
+                    if self.preview_scale != 1.0:
+                        frame = cv.resize(frame, None, fx=self.preview_scale, fy=self.preview_scale, interpolation=cv.INTER_AREA)
+                    if writer is None:
+                        writer = self._open(frame)
+                    writer.write(frame)
+                self.frames_written += 1
+        except Exception as error:
+            self._error = error
+            # Keep draining so producers blocked on a full queue are released
+            while self._queue.get() is not None:
+                pass
+        finally:
+            if writer is not None:
+                writer.release()
+
+    def _raise_error(self):
+        if self._error is not None:
+            raise self._error
+
+    def write(self, frame):
+        self._raise_error()
+        if self._frame_num % self.frame_stride == 0:
+            self._queue.put(frame)
+        self._frame_num += 1
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+        self._raise_error()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+def save_video(frames, video_path, fps=24.0, codec=None, queue_size=32, preview_scale=1.0, frame_stride=1,
+               profiler=None):
+    # Accepts a list or any iterator of frames, so annotated frames can be streamed straight into the writer
+    with BackgroundVideoWriter(video_path, fps, codec, queue_size, preview_scale, frame_stride, profiler) as writer:
+        for frame in frames:
+            writer.write(frame)
+    return writer.frames_written
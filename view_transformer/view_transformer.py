@@ -0,0 +1,38 @@
+import numpy as np
+import cv2 as cv
+
+# Corners of the visible pitch section in the sample match footage, in pixels, and the same corners in
+# metres on the pitch: the section is 23.32 m long (four grass stripes) and the full 68 m wide
+PITCH_WIDTH = 68
+PITCH_SECTION_LENGTH = 23.32
+PIXEL_VERTICES = ((110, 1035), (265, 275), (910, 260), (1640, 915))
+PITCH_VERTICES = ((0, PITCH_WIDTH), (0, 0), (PITCH_SECTION_LENGTH, 0), (PITCH_SECTION_LENGTH, PITCH_WIDTH))
+
+
+class ViewTransformer:
+    # Maps camera-compensated image positions to pitch coordinates in metres with a perspective homography.
+    # Positions outside the calibrated quadrilateral are left as NaN, where the homography is unreliable.
+    def __init__(self, pixel_vertices=PIXEL_VERTICES, pitch_vertices=PITCH_VERTICES):
+        self.pixel_vertices = np.asarray(pixel_vertices, dtype=np.float32)
+        self.pitch_vertices = np.asarray(pitch_vertices, dtype=np.float32)
+        self.matrix = cv.getPerspectiveTransform(self.pixel_vertices, self.pitch_vertices)
+
+    def inside(self, points):
+        # Point-in-convex-polygon for all points at once: same side of every edge
+        edges = np.roll(self.pixel_vertices, -1, axis=0) - self.pixel_vertices
+        to_points = points[:, None, :] - self.pixel_vertices[None]
+        cross = edges[None, :, 0] * to_points[..., 1] - edges[None, :, 1] * to_points[..., 0]
+        return (cross >= 0).all(axis=1) | (cross <= 0).all(axis=1)
+
+    def transform_points(self, points):
+        points = np.asarray(points, dtype=np.float32).reshape(-1, 2)
+        transformed = np.full(points.shape, np.nan, dtype=np.float32)
+        valid = np.isfinite(points).all(axis=1) & self.inside(points)
+        if valid.any():
+            transformed[valid] = cv.perspectiveTransform(points[valid].reshape(-1, 1, 2), self.matrix).reshape(-1, 2)
+        return transformed
+
+    def add_transformed_positions(self, tracks):
+        # One batched transform over every row of a TrackTable
+        tracks.columns["position_transformed"] = self.transform_points(tracks["position_adjusted"])
+        tracks.fields.add("position_transformed")